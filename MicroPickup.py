@@ -2,183 +2,951 @@
 # Date 30/04/2019
 # Purpose: Program a micro:bit to play a game where you walk in cardinal directions to pick up items.
 # This application is licensed under the Creative Commons Zero v1.0 Universal, public domain.
-# Comments are excluded hereafter due to Micro:bit memory limitations (16KB static RAM).
+# Comments are excluded hereafter to keep the file small. MicroPickupCommented.py is the same code, commented.
+# Too large for a micro:bit V1 (16KB static RAM). See README.txt for how to put it on a micro:bit V2.
 
-from microbit import compass, accelerometer, sleep
-import microbit
-import math
+import gc
 import random
+from array import array
+
+try:
+    import microbit
+except ImportError:
+    microbit = None
 
 MAX_POSITION = 4
-MIN_POSITION = 0
 SCREEN_CENTER = 2
-draw_pixel = microbit.display.set_pixel
+GRID_WIDTH = 5
+GRID_HEIGHT = 5
+GRID_CELLS = 25
+PLAYER_CELL_BITS = 5
+SCROLL_COLUMNS_PER_CHARACTER = 6
+START_CELL = SCREEN_CENTER * GRID_WIDTH + SCREEN_CENTER
+PICKUP_BRIGHTNESS = 3
+DIRECTION_NAMES = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+DIRECTION_X = (0, 1, 1, 1, 0, -1, -1, -1)
+DIRECTION_Y = (-1, -1, 0, 1, 1, 1, 0, -1)
+DIRECTION_COUNT = 8
+DIRECTION_SHIFT = 3
+NORTH = 0
+NORTH_EAST = 1
+EAST = 2
+SOUTH_EAST = 3
+SOUTH = 4
+SOUTH_WEST = 5
+WEST = 6
+NORTH_WEST = 7
+RESTING_ACCELERATION = 1000
+STEP_WINDOW = 4
+STEP_WINDOW_SHIFT = 2
+TICKS_MAX = (1 << 30) - 1
+TICKS_HALF = 1 << 29
+EVENT_STEP = 1
+EVENT_HEADING = 2
+EVENT_BUTTON_A = 3
+EVENT_BUTTON_B = 4
+EVENT_TIMER = 5
+EVENT_QUEUE_SIZE = 16
+CALIBRATION_TAG = "MPC1"
+CALIBRATION_CHECK = 0x5A5A
+MAGNETIC_SHIFT = 6
+ACCELERATION_SHIFT = 3
+ANGLE_SHIFT = 10
+ANGLE_ONE = 1 << ANGLE_SHIFT
+ANGLE_LIMIT = 1 << 20
+
+
+def ticksAdd(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticksDiff(end, start):
+    return ((end - start + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def buildNeighbourCells():
+    neighbours = bytearray(GRID_CELLS << DIRECTION_SHIFT)
+
+    for cell in range(GRID_CELLS):
+        x = cell % GRID_WIDTH
+        y = cell // GRID_WIDTH
+        for direction in range(DIRECTION_COUNT):
+            next_x = min(max(x + DIRECTION_X[direction], 0), MAX_POSITION)
+            next_y = min(max(y + DIRECTION_Y[direction], 0), MAX_POSITION)
+            neighbours[cell << DIRECTION_SHIFT | direction] = next_y * GRID_WIDTH + next_x
+
+    return neighbours
+
+
+NEIGHBOUR_CELLS = buildNeighbourCells()
+
+
+def isqrt(value):
+    if value <= 0:
+        return 0
+
+    root = 1
+    remaining = value
+    while remaining >= 4:
+        remaining >>= 2
+        root <<= 1
+
+    root <<= 1
+    estimate = (root + value // root) >> 1
+    while estimate < root:
+        root = estimate
+        estimate = (root + value // root) >> 1
+
+    return root
+
+
+def fixedMultiply(a, b, shift):
+    return (a * b) >> shift
+
+
+def ema(average, sample, shift):
+    return average + ((sample - average) >> shift)
+
+
+def atan2Degrees(y, x):
+    big = abs(x)
+    small = abs(y)
+    steep = small > big
+    if steep:
+        big, small = small, big
+
+    if big == 0:
+        return 0
+
+    while big >= ANGLE_LIMIT:
+        big >>= 1
+        small >>= 1
+
+    ratio = (small << ANGLE_SHIFT) // big
+    curve = fixedMultiply(fixedMultiply(ratio, ANGLE_ONE - ratio, ANGLE_SHIFT),
+                          14356 + fixedMultiply(3890, ratio, ANGLE_SHIFT), ANGLE_SHIFT)
+    angle = (45 * ratio + curve + (ANGLE_ONE >> 1)) >> ANGLE_SHIFT
 
+    if steep:
+        angle = 90 - angle
+    if x < 0:
+        angle = 180 - angle
+    if y < 0:
+        angle = 360 - angle
 
-class Position:
-    x = 0
-    y = 0
+    return angle % 360
 
 
 class GameObject:
 
-    position = Position()
+    cell = START_CELL
     brightness = 0
 
 
 class Player(GameObject):
 
     def __init__(self):
-        self.position.x = SCREEN_CENTER
-        self.position.y = SCREEN_CENTER
+        self.cell = START_CELL
         self.brightness = 9
 
     def reset(self):
-        self.position.x = SCREEN_CENTER
-        self.position.y = SCREEN_CENTER
+        self.cell = START_CELL
 
     def move(self, direction):
-        if direction == "N":
-            self.position.y = self.constrainToBoundaries(self.position.y - 1)
-        elif direction == "S":
-            self.position.y = self.constrainToBoundaries(self.position.y + 1)
-        elif direction == "W":
-            self.position.x = self.constrainToBoundaries(self.position.x - 1)
-        elif direction == "E":
-            self.position.x = self.constrainToBoundaries(self.position.x + 1)
+        self.cell = NEIGHBOUR_CELLS[self.cell << DIRECTION_SHIFT | direction & (DIRECTION_COUNT - 1)]
 
-    def draw(self):
-        draw_pixel(self.position.x, self.position.y, self.brightness)
+    def draw(self, frame):
+        frame[self.cell] = self.brightness
+
+
+class PickupStore:
+
+    def __init__(self):
+        self.cells = bytearray(GRID_CELLS)
+        self.brightness = bytearray(GRID_CELLS)
+        self.count = 0
+        self.mask = 0
+
+    def clear(self):
+        self.count = 0
+        self.mask = 0
+
+    def add(self, cell, brightness):
+        index = self.count
+        self.cells[index] = cell
+        self.brightness[index] = brightness
+        self.count = index + 1
+        self.mask |= 1 << cell
+
+    def remove(self, cell):
+        if not self.mask >> cell & 1:
+            return False
+
+        cells = self.cells
+        index = 0
+        while cells[index] != cell:
+            index += 1
+
+        last = self.count - 1
+        cells[index] = cells[last]
+        self.brightness[index] = self.brightness[last]
+        self.count = last
+        self.mask &= ~(1 << cell)
+
+        return True
+
+    def draw(self, frame):
+        cells = self.cells
+        brightness = self.brightness
+
+        for index in range(self.count):
+            frame[cells[index]] = brightness[index]
+
+
+class StepDetector:
+    refractory_period = 250
+
+    def __init__(self):
+        self.samples = array("l", [0] * STEP_WINDOW)
+        self.index = 0
+        self.total = 0
+        self.high = 0
+        self.low = 0
+        self.in_peak = False
+        self.peak_found = False
+        self.peak = 0
+        self.last_step_time = 0
+        self.last_active_time = 0
+        self.steps = 0
+
+    def setThreshold(self, threshold):
+        low = (threshold + RESTING_ACCELERATION) // 2
+        self.high = threshold * threshold
+        self.low = low * low
+
+    def reset(self, now):
+        self.in_peak = False
+        self.last_step_time = ticksAdd(now, -self.refractory_period)
+        self.last_active_time = now
+        self.steps = 0
+
+    def sample(self, acceleration_squared, now):
+        index = self.index
+        self.total += acceleration_squared - self.samples[index]
+        self.samples[index] = acceleration_squared
+        self.index = (index + 1) & (STEP_WINDOW - 1)
+        level = self.total >> STEP_WINDOW_SHIFT
+
+        if level > self.low:
+            self.last_active_time = now
+
+        if not self.in_peak:
+            if level > self.high:
+                self.in_peak = True
+                self.peak_found = False
+                self.peak = level
+        elif level < self.low:
+            self.in_peak = False
+        elif not self.peak_found:
+            if level < self.peak:
+                self.peak_found = True
+                if ticksDiff(now, self.last_step_time) >= self.refractory_period:
+                    self.last_step_time = now
+                    self.steps += 1
+            else:
+                self.peak = level
+
+    def takeSteps(self):
+        steps = self.steps
+        self.steps = 0
+
+        return steps
+
+
+class CompassCalibrator:
+    minimum_span = 20000
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calibrated = False
+        self.samples = 0
+        self.octants = 0
+        self.min_x = 0
+        self.max_x = 0
+        self.min_y = 0
+        self.max_y = 0
+        self.min_z = 0
+        self.max_z = 0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.offset_z = 0
+
+    def sample(self, x, y, z):
+        if self.samples == 0:
+            self.min_x = self.max_x = x
+            self.min_y = self.max_y = y
+            self.min_z = self.max_z = z
+
+        self.samples += 1
+
+        if x < self.min_x:
+            self.min_x = x
+        elif x > self.max_x:
+            self.max_x = x
+        if y < self.min_y:
+            self.min_y = y
+        elif y > self.max_y:
+            self.max_y = y
+        if z < self.min_z:
+            self.min_z = z
+        elif z > self.max_z:
+            self.max_z = z
+
+        if self.calibrated:
+            return
+
+        self.offset_x = (self.min_x + self.max_x) >> 1
+        self.offset_y = (self.min_y + self.max_y) >> 1
+        self.offset_z = self.getCentreZ()
+        x -= self.offset_x
+        y -= self.offset_y
+        octant = 0
+        if y < 0:
+            octant |= 4
+        if x < 0:
+            octant |= 2
+        if abs(x) < abs(y):
+            octant |= 1
+        self.octants |= 1 << octant
+
+        if self.octants == 0xFF and self.max_x - self.min_x >= self.minimum_span:
+            if self.max_y - self.min_y >= self.minimum_span:
+                self.calibrated = True
+
+    def getCentreZ(self):
+        if self.max_z - self.min_z < self.minimum_span:
+            return 0
+
+        return (self.min_z + self.max_z) >> 1
+
+    def getChecksum(self, values):
+        check = CALIBRATION_CHECK
+        for value in values:
+            check = (check * 31 + value) & 0xFFFF
+
+        return check
+
+    def save(self, filename):
+        values = (self.min_x, self.max_x, self.min_y, self.max_y, self.min_z, self.max_z)
+        fields = [CALIBRATION_TAG]
+        for value in values:
+            fields.append(str(value))
+        fields.append(str(self.getChecksum(values)))
+
+        try:
+            with open(filename, "w") as file:
+                file.write(",".join(fields))
+        except OSError:
+            pass
+
+    def load(self, filename):
+        try:
+            with open(filename) as file:
+                fields = file.read().split(",")
+        except OSError:
+            return False
+
+        if len(fields) != 8 or fields[0] != CALIBRATION_TAG:
+            return False
+
+        try:
+            values = [int(field) for field in fields[1:]]
+        except ValueError:
+            return False
+
+        check = values.pop()
+        if check != self.getChecksum(values):
+            return False
+
+        min_x, max_x, min_y, max_y, min_z, max_z = values
+        if max_x - min_x < self.minimum_span or max_y - min_y < self.minimum_span or max_z < min_z:
+            return False
+
+        self.reset()
+        self.min_x = min_x
+        self.max_x = max_x
+        self.min_y = min_y
+        self.max_y = max_y
+        self.min_z = min_z
+        self.max_z = max_z
+        self.samples = 1
+        self.octants = 0xFF
+        self.offset_x = (min_x + max_x) >> 1
+        self.offset_y = (min_y + max_y) >> 1
+        self.offset_z = self.getCentreZ()
+        self.calibrated = True
 
-    def constrainToBoundaries(self, value):
-        if value < MIN_POSITION:
-            return MIN_POSITION
-        if value > MAX_POSITION:
-            return MAX_POSITION
+        return True
 
-        return value
 
+class HeadingFilter:
+    smoothing_shift = 1
 
-class Pickup(GameObject):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.east = 0
+        self.north = 0
+        self.primed = False
+
+    def sample(self, mx, my, mz, ax, ay, az):
+        mx >>= MAGNETIC_SHIFT
+        my >>= MAGNETIC_SHIFT
+        mz >>= MAGNETIC_SHIFT
+        ux = -ax >> ACCELERATION_SHIFT
+        uy = -ay >> ACCELERATION_SHIFT
+        uz = -az >> ACCELERATION_SHIFT
+        up_squared = ux * ux + uy * uy + uz * uz
+
+        if up_squared == 0:
+            return
+
+        east_x = my * uz - mz * uy
+        east_y = mz * ux - mx * uz
+        east_z = mx * uy - my * ux
+        north_y = uz * east_x - ux * east_z
+        east = (east_y << 2) // isqrt(up_squared)
+        north = (north_y << 2) // up_squared
+
+        if self.primed:
+            self.east = ema(self.east, east, self.smoothing_shift)
+            self.north = ema(self.north, north, self.smoothing_shift)
+        else:
+            self.east = east
+            self.north = north
+            self.primed = True
+
+    def heading(self):
+        return atan2Degrees(self.east, self.north)
+
+
+class EventQueue:
 
     def __init__(self):
-        self.position = Position()
-        self.position.x = random.randrange(MAX_POSITION + 1)
-        self.position.y = random.randrange(MAX_POSITION + 1)
-        self.brightness = 3
+        self.events = bytearray(EVENT_QUEUE_SIZE)
+        self.values = bytearray(EVENT_QUEUE_SIZE)
+        self.head = 0
+        self.length = 0
+        self.value = 0
+        self.dropped = 0
+
+    def push(self, event, value=0):
+        if self.length == EVENT_QUEUE_SIZE:
+            self.dropped += 1
+            return
+
+        index = (self.head + self.length) & (EVENT_QUEUE_SIZE - 1)
+        self.events[index] = event
+        self.values[index] = value
+        self.length += 1
+
+    def pop(self):
+        index = self.head
+        self.value = self.values[index]
+        self.head = (index + 1) & (EVENT_QUEUE_SIZE - 1)
+        self.length -= 1
+
+        return self.events[index]
+
+    def clear(self):
+        self.head = 0
+        self.length = 0
+
+
+class Scheduler:
+
+    def __init__(self, ticks, sleep):
+        self.ticks = ticks
+        self.sleep = sleep
+        self.tasks = []
+        self.deadlines = []
+        self.overruns = 0
+        self.steps = 0
+
+    def spawn(self, task):
+        self.tasks.append(task)
+        self.deadlines.append(self.ticks())
+
+        return len(self.tasks) - 1
+
+    def wake(self, index):
+        self.deadlines[index] = self.ticks()
+
+    def run(self, main_index):
+        tasks = self.tasks
+        deadlines = self.deadlines
+        ticks = self.ticks
+        sleep = self.sleep
+
+        while True:
+            index = -1
+            for candidate in range(len(tasks)):
+                if tasks[candidate] is not None:
+                    if index < 0 or ticksDiff(deadlines[candidate], deadlines[index]) < 0:
+                        index = candidate
+
+            deadline = deadlines[index]
+            wait = ticksDiff(deadline, ticks())
+            if wait > 0:
+                sleep(wait)
+
+            try:
+                delay = next(tasks[index])
+            except StopIteration:
+                tasks[index] = None
+                if index == main_index:
+                    break
+                continue
+
+            self.steps += 1
+            now = ticks()
+            deadline = ticksAdd(deadline, delay)
+            if ticksDiff(deadline, now) <= 0:
+                self.overruns += 1
+                deadline = ticksAdd(now, delay)
+            deadlines[index] = deadline
+
+        for task in tasks:
+            if task is not None:
+                task.close()
+
+        self.tasks = []
+        self.deadlines = []
 
 
 class Game:
-    player = Player()
-    pickups = []
     game_running = True
+    level_running = False
     acceleration_needed_to_move = 1200
+    image_cache_size = 8
+    scroll_end_time = 0
+    scrolling = False
+    facing = 0
+    sensed_facing = -1
+    frame_dirty = True
+    sense_period = 20
+    logic_period = 100
+    render_period = 100
+    heading_period = 100
+    next_heading_time = 0
+    idle_after = 5000
+    idle_sense_period = 100
+    idle_logic_period = 500
+    idle_render_period = 500
+    idle = False
+    mode_start_time = 0
+    active_time = 0
+    idle_time = 0
+    idle_count = 0
+    acceleration_x = 0
+    acceleration_y = 0
+    acceleration_z = -RESTING_ACCELERATION
+    calibration_period = 100
+    use_builtin_heading = False
+    facing_hysteresis = 15
+    eight_way = False
+    calibration_file = "calibration.txt"
+    calibration_loaded = False
+    calibration_saved = False
+    starting_pickup_amount = 4
+    pickup_amount_increase = 1
+    levels_completed = 0
+    last_level_time = 0
+    last_level_allocated = 0
+    last_level_steps = 0
+    allocating_levels = 0
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = microbit
+
+        self.display = backend.display
+        self.compass = backend.compass
+        self.accelerometer = backend.accelerometer
+        self.button_a = backend.button_a
+        self.button_b = backend.button_b
+        self.running_time = backend.running_time
+        self.sleep = backend.sleep
+        self.Image = backend.Image
+        self.frame = bytearray(GRID_CELLS)
+        self.player = Player()
+        self.pickups = PickupStore()
+        self.drawn_frame_key = -1
+        self.images = {}
+        self.image_keys = []
+        self.free_images = [self.Image(GRID_WIDTH, GRID_HEIGHT) for index in range(self.image_cache_size)]
+        self.memory_used = getattr(gc, "mem_alloc", None)
+        self.step_detector = StepDetector()
+        self.events = EventQueue()
+        self.calibrator = CompassCalibrator()
+        self.heading_filter = HeadingFilter()
+        self.scheduler = Scheduler(self.ticks, self.sleep)
+        self.logic_task = -1
+        self.render_task = -1
+        self.spawn_cells = bytearray(cell for cell in range(GRID_CELLS) if cell != START_CELL)
 
-    def __init__(self):
         self.setup()
 
     def spawnPickups(self, amount):
-        self.pickups.clear()
+        spawn_cells = self.spawn_cells
+        cell_amount = len(spawn_cells)
+        pickups = self.pickups
+        pickups.clear()
 
-        for x in range(amount):
-            new_pickup = Pickup()
+        if amount > cell_amount:
+            amount = cell_amount
 
-            self.pickups.append(new_pickup)
+        for index in range(amount):
+            swap_index = random.randrange(index, cell_amount)
+            cell = spawn_cells[swap_index]
+            spawn_cells[swap_index] = spawn_cells[index]
+            spawn_cells[index] = cell
+            pickups.add(cell, PICKUP_BRIGHTNESS)
 
-    def drawPickups(self):
-        for pickup in self.pickups:
-            draw_pixel(pickup.position.x, pickup.position.y, pickup.brightness)
+    def drawPickups(self, frame):
+        self.pickups.draw(frame)
 
     def findApproxFacingDirection(self):
-        cardinal_direction = ""
+        heading = self.getHeading()
+        facing = self.sensed_facing
+
+        if self.eight_way:
+            sector = 45
+            step = 1
+        else:
+            sector = 90
+            step = 2
+        half_sector = sector // 2
 
-        if compass.heading() > 315 or compass.heading() < 45:
-            cardinal_direction = "N"
-        elif compass.heading() > 225 and compass.heading() < 315:
-            cardinal_direction = "W"
-        elif compass.heading() > 135 and compass.heading() < 225:
-            cardinal_direction = "S"
-        elif compass.heading() > 45 and compass.heading() < 135:
-            cardinal_direction = "E"
+        if facing >= 0:
+            difference = (heading - facing * 45 + 180) % 360 - 180
+            if -half_sector - self.facing_hysteresis <= difference <= half_sector + self.facing_hysteresis:
+                return facing
 
-        return cardinal_direction
+        return (heading + half_sector) // sector * step & (DIRECTION_COUNT - 1)
 
-    def getAcceleration(self):
+    def getHeading(self):
+        calibrator = self.calibrator
+
+        if self.use_builtin_heading and not calibrator.calibrated:
+            return self.compass.heading()
+
+        x = self.compass.get_x()
+        y = self.compass.get_y()
+        z = self.compass.get_z()
+        calibrator.sample(x, y, z)
+
+        heading_filter = self.heading_filter
+        heading_filter.sample(x - calibrator.offset_x, y - calibrator.offset_y, z - calibrator.offset_z,
+                              self.acceleration_x, self.acceleration_y, self.acceleration_z)
+
+        return heading_filter.heading()
+
+    def getAccelerationSquared(self):
+        accelerometer = self.accelerometer
         x = accelerometer.get_x()
         y = accelerometer.get_y()
         z = accelerometer.get_z()
+        self.acceleration_x = x
+        self.acceleration_y = y
+        self.acceleration_z = z
 
-        acceleration = math.sqrt(x ** 2 + y ** 2 + z ** 2)
+        return x * x + y * y + z * z
 
-        return acceleration
-
-    @staticmethod
-    def setup():
-        if not compass.is_calibrated():
-            compass.calibrate()
+    def setup(self):
+        self.use_builtin_heading = self.compass.is_calibrated()
 
     def update(self):
-        for pickup in self.pickups:
-            if pickup.position.x == self.player.position.x:
-                if pickup.position.y == self.player.position.y:
-                    self.pickups.remove(pickup)
+        self.pickups.remove(self.player.cell)
 
     def startLevel(self, pickup_amount):
+        self.step_detector.setThreshold(self.acceleration_needed_to_move)
 
         self.spawnPickups(pickup_amount)
         self.player.reset()
 
-        microbit.display.clear()
+        self.drawn_frame_key = -1
+        self.frame_dirty = True
+
+    def senseHeading(self):
+        facing = self.findApproxFacingDirection()
+
+        if facing != self.sensed_facing:
+            self.sensed_facing = facing
+            self.events.push(EVENT_HEADING, facing)
+
+    def senseSteps(self, now):
+        step_detector = self.step_detector
+        step_detector.sample(self.getAccelerationSquared(), now)
+        steps = step_detector.takeSteps()
+
+        if steps or not self.idle and ticksDiff(now, self.next_heading_time) >= 0:
+            self.next_heading_time = ticksAdd(now, self.heading_period)
+            self.senseHeading()
+
+        if steps and self.level_running:
+            for step in range(steps):
+                self.events.push(EVENT_STEP)
 
     def getInput(self):
-        direction = self.findApproxFacingDirection()
+        if self.button_b.was_pressed():
+            self.events.push(EVENT_BUTTON_B)
+        elif self.button_a.was_pressed():
+            self.events.push(EVENT_BUTTON_A)
+
+    def handleEvents(self):
+        events = self.events
+
+        while events.length:
+            event = events.pop()
+
+            if event == EVENT_STEP:
+                self.player.move(self.facing)
+                self.update()
+            elif event == EVENT_HEADING:
+                self.facing = events.value
+            elif event == EVENT_BUTTON_B:
+                scroll_delay = 100
+                self.scrollText(DIRECTION_NAMES[self.facing], scroll_delay)
+            elif event == EVENT_BUTTON_A:
+                self.calibrator.reset()
+                self.heading_filter.reset()
+                self.use_builtin_heading = False
+                self.calibration_saved = False
+
+        self.frame_dirty = True
+
+    def ticks(self):
+        return self.running_time() & TICKS_MAX
+
+    def scrollText(self, text, delay=150):
+        self.display.scroll(text, delay, wait=False, monospace=True)
+        self.scrolling = True
+        self.drawn_frame_key = -1
+        duration = (len(text) * SCROLL_COLUMNS_PER_CHARACTER + GRID_WIDTH) * delay
+        self.scroll_end_time = ticksAdd(self.ticks(), duration)
+
+    def isScrolling(self):
+        return ticksDiff(self.scroll_end_time, self.ticks()) > 0
+
+    def updatePowerMode(self, now):
+        idle = ticksDiff(now, self.step_detector.last_active_time) >= self.idle_after
+        elapsed = ticksDiff(now, self.mode_start_time)
+        self.mode_start_time = now
+
+        if self.idle:
+            self.idle_time += elapsed
+        else:
+            self.active_time += elapsed
+
+        if idle == self.idle:
+            return False
 
-        if self.getAcceleration() > self.acceleration_needed_to_move:
-            self.player.move(direction)
+        self.idle = idle
+        if idle:
+            self.idle_count += 1
 
-        if microbit.button_b.was_pressed():
-            scroll_delay = 100
-            microbit.display.scroll(self.findApproxFacingDirection(), scroll_delay)
-        elif microbit.button_a.was_pressed():
-            compass.calibrate()
+        return not idle
 
     def draw(self):
-        microbit.display.clear()
-        self.drawPickups()
-        self.player.draw()
+        frame_key = self.pickups.mask << PLAYER_CELL_BITS | self.player.cell
+
+        if frame_key == self.drawn_frame_key:
+            return
+
+        self.drawn_frame_key = frame_key
+        self.display.show(self.getFrameImage(frame_key))
+
+    def getFrameImage(self, frame_key):
+        images = self.images
+        image_keys = self.image_keys
+        image = images.get(frame_key)
+
+        if image is None:
+            frame = self.frame
+            for cell in range(GRID_CELLS):
+                frame[cell] = 0
+
+            self.drawPickups(frame)
+            self.player.draw(frame)
+
+            if len(image_keys) >= self.image_cache_size:
+                image = images.pop(image_keys.pop(0))
+            elif self.free_images:
+                image = self.free_images.pop()
+            else:
+                image = self.Image(GRID_WIDTH, GRID_HEIGHT)
+
+            cell = 0
+            for y in range(GRID_HEIGHT):
+                for x in range(GRID_WIDTH):
+                    image.set_pixel(x, y, frame[cell])
+                    cell += 1
+
+            images[frame_key] = image
+        else:
+            image_keys.remove(frame_key)
+
+        image_keys.append(frame_key)
+
+        return image
+
+    def getMemoryUsed(self):
+        if self.memory_used is None:
+            return 0
+
+        return self.memory_used()
 
     def isGameOver(self):
-        is_pickups_empty = len(self.pickups) < 1
+        is_pickups_empty = self.pickups.count == 0
 
         if is_pickups_empty:
             return True
         else:
             return False
 
-    def playGame(self):
-        microbit.display.scroll("WALK TO PICK UP ITEMS.")
-
-        pickup_amount = 4
+    def senseTask(self):
+        scheduler = self.scheduler
+        ticks = self.ticks
+        sense_steps = self.senseSteps
+        update_power_mode = self.updatePowerMode
+        self.next_heading_time = ticks()
+
+        while True:
+            now = ticks()
+            sense_steps(now)
+
+            if update_power_mode(now):
+                scheduler.wake(self.logic_task)
+                scheduler.wake(self.render_task)
+
+            if self.idle:
+                yield self.idle_sense_period
+            else:
+                yield self.sense_period
+
+    def loadCalibration(self):
+        if self.calibration_file and self.calibrator.load(self.calibration_file):
+            self.calibration_loaded = True
+            self.calibration_saved = True
+
+    def calibrationTask(self):
+        compass = self.compass
+        calibrator = self.calibrator
+
+        while True:
+            if calibrator.calibrated:
+                if not self.calibration_saved and self.calibration_file:
+                    calibrator.save(self.calibration_file)
+                    self.calibration_saved = True
+                yield self.idle_logic_period
+            elif self.idle or not self.use_builtin_heading:
+                yield self.idle_logic_period
+            else:
+                calibrator.sample(compass.get_x(), compass.get_y(), compass.get_z())
+                yield self.calibration_period
+
+    def renderTask(self):
+        is_scrolling = self.isScrolling
+        draw = self.draw
+
+        while True:
+            if self.frame_dirty and not is_scrolling():
+                self.frame_dirty = False
+                draw()
+
+            if self.idle:
+                yield self.idle_render_period
+            else:
+                yield self.render_period
+
+    def textTask(self):
+        while True:
+            if self.scrolling:
+                wait = ticksDiff(self.scroll_end_time, self.ticks())
+                if wait > 0:
+                    yield wait
+                    continue
+
+                self.scrolling = False
+                self.events.push(EVENT_TIMER)
+
+            yield self.logic_period
+
+    def logicTask(self):
+        events = self.events
+        is_game_over = self.isGameOver
+        get_input = self.getInput
+        handle_events = self.handleEvents
+
+        self.scrollText("WALK TO PICK UP ITEMS.")
+
+        pickup_amount = self.starting_pickup_amount
 
         while self.game_running:
 
             self.startLevel(pickup_amount)
-            level_start_time = microbit.running_time()
-
-            while not self.isGameOver():
-                self.getInput()
-                self.update()
-                self.draw()
+            gc.collect()
+            while self.isScrolling():
+                yield ticksDiff(self.scroll_end_time, self.ticks())
+
+            level_start_time = self.ticks()
+            self.step_detector.reset(level_start_time)
+            events.clear()
+            self.level_running = True
+            self.sensed_facing = -1
+            level_start_steps = self.scheduler.steps
+            level_start_memory = self.getMemoryUsed()
+
+            while not is_game_over():
+                get_input()
+                if events.length:
+                    handle_events()
+
+                if self.idle:
+                    yield self.idle_logic_period
+                else:
+                    yield self.logic_period
+
+            self.level_running = False
+            self.last_level_allocated = self.getMemoryUsed() - level_start_memory
+            self.last_level_steps = self.scheduler.steps - level_start_steps
+            self.last_level_time = ticksDiff(self.ticks(), level_start_time)
+            if self.last_level_allocated != 0:
+                self.allocating_levels += 1
+            self.levels_completed += 1
+            seconds_elapsed = self.last_level_time // 1000
+
+            self.scrollText("TIME:" + str(seconds_elapsed) + " SECONDS.")
+
+            pickup_amount += self.pickup_amount_increase
 
-                if self.isGameOver():
-                    current_time = microbit.running_time()
-                    seconds_elapsed = (current_time - level_start_time) / 1000
-
-                    microbit.display.scroll("TIME:" + str(int(seconds_elapsed)) + " SECONDS.")
-
-                    pickup_amount += 1
-
-                sleep(100)
+    def playGame(self):
+        scheduler = self.scheduler
+        self.idle = False
+        self.mode_start_time = self.ticks()
+        self.loadCalibration()
+
+        scheduler.spawn(self.senseTask())
+        self.render_task = scheduler.spawn(self.renderTask())
+        scheduler.spawn(self.textTask())
+        scheduler.spawn(self.calibrationTask())
+        self.logic_task = scheduler.spawn(self.logicTask())
+
+        scheduler.run(self.logic_task)
 
 
 def main():
@@ -0,0 +1,366 @@
+# Author: Nathan Dunne
+# Date 30/04/2019
+# Purpose: Check MicroPickup's fixed-point maths against float versions, and time how long each call takes.
+# This application is licensed under the Creative Commons Zero v1.0 Universal, public domain.
+# This file is never flashed to the micro:bit, so it is commented normally.
+# It runs on CPython, or on the MicroPython unix port to see the cost on MicroPython itself:
+# python MicroPickupBenchmark.py
+# micropython MicroPickupBenchmark.py
+# On MicroPython it also checks that the calls the game makes every tick allocate nothing, and plays a few whole
+# levels to check the game loop as a whole allocates nothing either. CPython boxes its ints, so there both are skipped.
+
+import gc
+import math
+import sys
+import time
+from array import array
+
+import MicroPickup
+
+BENCHMARK_CALLS = 10000
+ALLOCATION_CALLS = 1000
+ATAN2_TOLERANCE = 1  # Degrees. Whole degrees are returned, so this allows for rounding.
+GAME_LEVELS = 5  # Whole levels played to check the game loop. The first fills the frame cache, so is not checked.
+HORIZONTAL_FIELD = 20000  # The Earth's magnetic field along the ground, in nano-tesla.
+VERTICAL_FIELD = -45000  # And straight down into it.
+STRIDE_PERIOD = 500  # The stand-in player takes a step this often, in milliseconds.
+STEP_DURATION = 100  # For this long at the start of each stride,
+STEP_ACCELERATION = 1500  # the board is pushed with this acceleration, in milli-g.
+
+
+# Microseconds from an arbitrary start, on either port.
+if hasattr(time, "ticks_us"):
+    def ticksUs():
+        return time.ticks_us()
+else:
+    def ticksUs():
+        return int(time.perf_counter() * 1000000)
+
+
+# The shortest way round between two angles, in degrees.
+def angleError(a, b):
+    error = abs(a - b) % 360
+    return min(error, 360 - error)
+
+
+# Check isqrt is exact, against math.sqrt, for small values and ones the size the game uses.
+def checkIsqrt():
+    worst = 0
+    for start in (0, 1000000, 1 << 28):
+        for value in range(start, start + 20000):
+            error = abs(MicroPickup.isqrt(value) - int(math.sqrt(value)))
+            worst = max(worst, error)
+
+    return worst, worst == 0
+
+
+# Check atan2Degrees all the way round, at small and large scales, against math.atan2.
+def checkAtan2():
+    worst = 0
+    for radius in (3, 100, 30000, 5000000):
+        for tenth in range(3600):
+            angle = math.radians(tenth / 10)
+            x = int(radius * math.cos(angle))
+            y = int(radius * math.sin(angle))
+            if x == 0 and y == 0:
+                continue
+            reference = math.degrees(math.atan2(y, x)) % 360
+            worst = max(worst, angleError(MicroPickup.atan2Degrees(y, x), reference))
+
+    return worst, worst <= ATAN2_TOLERANCE
+
+
+# Check fixedMultiply only loses the fraction that is shifted away.
+def checkFixedMultiply():
+    worst = 0
+    for a in range(-3000, 3000, 7):
+        for b in (-1024, -513, -1, 0, 1, 300, 1023, 4096):
+            reference = a * b / 1024
+            worst = max(worst, abs(MicroPickup.fixedMultiply(a, b, 10) - reference))
+
+    return worst, worst < 1
+
+
+# Check the integer moving average stays close to a float one fed the same samples, and settles on a constant input.
+def checkEma():
+    worst = 0
+    shift = 2
+    average = 0
+    reference = 0.0
+    for index in range(4000):
+        sample = (index * 7919) % 2001 - 1000  # A spread of values, the same on every run.
+        average = MicroPickup.ema(average, sample, shift)
+        reference += (sample - reference) / (1 << shift)
+        worst = max(worst, abs(average - reference))
+
+    for index in range(40):
+        average = MicroPickup.ema(average, 500, shift)
+
+    return worst, worst < (1 << shift) and abs(average - 500) < (1 << shift)
+
+
+# Get the average microseconds per call of function with the given arguments, less the cost of the loop itself.
+def benchmark(function, arguments, calls=BENCHMARK_CALLS):
+    start = ticksUs()
+    for index in range(calls):
+        pass
+    loop_time = ticksUs() - start
+
+    start = ticksUs()
+    for index in range(calls):
+        function(*arguments)
+    call_time = ticksUs() - start
+
+    return max(0, call_time - loop_time) / calls
+
+
+# Push and pop an event, as the sense and logic tasks do between them every step.
+def pushPop(events):
+    events.push(MicroPickup.EVENT_STEP, MicroPickup.NORTH)
+    events.pop()
+
+
+# Add and remove a pickup, as spawning and collecting do.
+def addRemove(pickups):
+    pickups.add(7, MicroPickup.PICKUP_BRIGHTNESS)
+    pickups.remove(7)
+
+
+# Get the bytes each of the game's per-tick calls allocates, or None where gc.mem_alloc is missing (CPython).
+# Every call is a lambda taking no arguments, so that calling it does not build an argument tuple of its own.
+def checkAllocations():
+    if not hasattr(gc, "mem_alloc"):
+        return None
+
+    heading_filter = MicroPickup.HeadingFilter()
+    calibrator = MicroPickup.CompassCalibrator()
+    step_detector = MicroPickup.StepDetector()
+    step_detector.setThreshold(1400)
+    events = MicroPickup.EventQueue()
+    pickups = MicroPickup.PickupStore()
+    player = MicroPickup.Player()
+
+    calls = (
+        ("isqrt", lambda: MicroPickup.isqrt(15625)),
+        ("atan2Degrees", lambda: MicroPickup.atan2Degrees(-9000, 12000)),
+        ("fixedMultiply", lambda: MicroPickup.fixedMultiply(700, 300, 10)),
+        ("ema", lambda: MicroPickup.ema(700, 300, 2)),
+        ("HeadingFilter.sample", lambda: heading_filter.sample(-9000, 12000, -45000, 0, 0, -1000)),
+        ("CompassCalibrator.sample", lambda: calibrator.sample(-9000, 12000, -45000)),
+        ("StepDetector.sample", lambda: step_detector.sample(1440000, 100)),
+        ("EventQueue push/pop", lambda: pushPop(events)),
+        ("PickupStore add/remove", lambda: addRemove(pickups)),
+        ("Player.move", lambda: player.move(MicroPickup.EAST)))
+
+    results = []
+    gc.collect()
+    gc.disable()  # A collection part way through would hide what was allocated.
+    try:
+        for name, call in calls:
+            call()  # The first call may set up attributes; only the steady state matters.
+            before = gc.mem_alloc()
+            for index in range(ALLOCATION_CALLS):
+                call()
+            results.append((name, (gc.mem_alloc() - before) // ALLOCATION_CALLS))
+    finally:
+        gc.enable()
+
+    return results
+
+
+# The stand-ins for the micro:bit's hardware used to play whole levels. None of them allocate once made, so anything
+# allocated while a level is played is the game's own.
+class StubDisplay:
+
+    def show(self, image):
+        pass
+
+    def scroll(self, text, delay=150, wait=True, monospace=False):
+        pass
+
+
+class StubImage:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.pixels = bytearray(width * height)
+
+    def set_pixel(self, x, y, value):
+        self.pixels[y * self.width + x] = value
+
+
+class StubButton:
+
+    def was_pressed(self):
+        return False
+
+
+# Reads the field for the board lying flat and pointing north, east, south or west, with no hard-iron offsets.
+# With the board facing north the field points along +y; turning clockwise swings it towards -x.
+class StubCompass:
+
+    def __init__(self):
+        self.direction = MicroPickup.NORTH
+
+    def get_x(self):
+        return -HORIZONTAL_FIELD * MicroPickup.DIRECTION_X[self.direction]
+
+    def get_y(self):
+        return -HORIZONTAL_FIELD * MicroPickup.DIRECTION_Y[self.direction]
+
+    def get_z(self):
+        return VERTICAL_FIELD
+
+    def is_calibrated(self):
+        return True
+
+
+class StubAccelerometer:
+
+    def __init__(self):
+        self.z = -MicroPickup.RESTING_ACCELERATION
+
+    def get_x(self):
+        return 0
+
+    def get_y(self):
+        return 0
+
+    def get_z(self):
+        return self.z
+
+
+# A virtual clock, and a player walking towards the first pickup left: east or west until in the right column, then
+# north or south, a step every stride. Sleeping moves the clock on and updates the player.
+# Each level's allocation and task steps are kept as it ends. The game is stopped once its last level is under way.
+class StubBackend:
+
+    def __init__(self, levels):
+        self.display = StubDisplay()
+        self.compass = StubCompass()
+        self.accelerometer = StubAccelerometer()
+        self.button_a = StubButton()
+        self.button_b = StubButton()
+        self.Image = StubImage
+        self.now = 0
+        self.game = None
+        self.levels = levels
+        self.levels_recorded = 0
+        self.level_allocated = array("l", [0] * levels)
+        self.level_steps = array("l", [0] * levels)
+
+    def running_time(self):
+        return self.now
+
+    def sleep(self, milliseconds):
+        self.now += milliseconds
+        self.recordLevel()
+        self.walk()
+
+    def recordLevel(self):
+        game = self.game
+        level = self.levels_recorded
+        if game.levels_completed > level:
+            self.level_allocated[level] = game.last_level_allocated
+            self.level_steps[level] = game.last_level_steps
+            self.levels_recorded = level + 1
+            if level == 0:
+                game.allocating_levels = 0  # The first level fills the frame cache, so is left out.
+
+        if game.level_running and game.levels_completed == self.levels - 1:
+            game.game_running = False
+
+    def walk(self):
+        game = self.game
+        cell = game.player.cell
+        target = game.pickups.cells[0]
+        column = target % MicroPickup.GRID_WIDTH - cell % MicroPickup.GRID_WIDTH
+
+        if column > 0:
+            self.compass.direction = MicroPickup.EAST
+        elif column < 0:
+            self.compass.direction = MicroPickup.WEST
+        elif target > cell:
+            self.compass.direction = MicroPickup.SOUTH
+        elif target < cell:
+            self.compass.direction = MicroPickup.NORTH
+
+        if self.now % STRIDE_PERIOD < STEP_DURATION:
+            self.accelerometer.z = -STEP_ACCELERATION
+        else:
+            self.accelerometer.z = -MicroPickup.RESTING_ACCELERATION
+
+
+# Play levels of the whole game on the stand-in hardware, in virtual time, and get the bytes each level allocated and
+# its task steps, with how many levels after the first allocated anything. None where gc.mem_alloc is missing.
+# The compass is treated as calibrated, so headings go through the game's own HeadingFilter.
+def checkGameAllocations(levels=GAME_LEVELS):
+    if not hasattr(gc, "mem_alloc"):
+        return None
+
+    backend = StubBackend(levels)
+    game = MicroPickup.Game(backend)
+    game.calibration_file = None
+    game.calibrator.calibrated = True
+    game.pickup_amount_increase = 0
+    backend.game = game
+
+    game.playGame()
+    backend.recordLevel()
+
+    results = [(backend.level_allocated[level], backend.level_steps[level]) for level in range(levels)]
+
+    return results, game.allocating_levels
+
+
+def main():
+    passed = True
+
+    print("function         worst error  ok")
+    for name, check in (("isqrt", checkIsqrt), ("atan2Degrees", checkAtan2), ("fixedMultiply", checkFixedMultiply),
+                        ("ema", checkEma)):
+        worst, ok = check()
+        passed = passed and ok
+        print("%-15s  %11.3f  %s" % (name, worst, "yes" if ok else "NO"))
+
+    heading_filter = MicroPickup.HeadingFilter()
+    player = MicroPickup.Player()
+    print()
+    print("function                  us per call")
+    for name, function, arguments in (
+            ("isqrt", MicroPickup.isqrt, (15625,)),
+            ("math.sqrt", math.sqrt, (15625,)),
+            ("atan2Degrees", MicroPickup.atan2Degrees, (-9000, 12000)),
+            ("math.atan2", math.atan2, (-9000, 12000)),
+            ("fixedMultiply", MicroPickup.fixedMultiply, (700, 300, 10)),
+            ("ema", MicroPickup.ema, (700, 300, 2)),
+            ("HeadingFilter.sample", heading_filter.sample, (-9000, 12000, -45000, 0, 0, -1000)),
+            ("Player.move", player.move, (MicroPickup.NORTH_EAST,))):
+        print("%-24s  %11.2f" % (name, benchmark(function, arguments)))
+
+    allocations = checkAllocations()
+    print()
+    if allocations is None:
+        print("allocation check needs MicroPython (gc.mem_alloc)")
+    else:
+        print("function                  bytes per call  ok")
+        for name, allocated in allocations:
+            passed = passed and allocated == 0
+            print("%-24s  %14d  %s" % (name, allocated, "yes" if allocated == 0 else "NO"))
+
+    game_allocations = checkGameAllocations()
+    if game_allocations is not None:
+        results, allocating_levels = game_allocations
+        passed = passed and allocating_levels == 0
+        print()
+        print("level  bytes allocated  steps  bytes per step")
+        for level, (allocated, steps) in enumerate(results):
+            print("%5d  %15d  %5d  %14.2f" % (level + 1, allocated, steps, allocated / max(steps, 1)))
+        print("levels after the first that allocated: %d" % allocating_levels)
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
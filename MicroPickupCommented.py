@@ -2,28 +2,168 @@
 # Date 30/04/2019
 # Purpose: Program a micro:bit to play a game where you walk in cardinal directions to pick up items.
 # This application is licensed under the Creative Commons Zero v1.0 Universal, public domain.
+# This is MicroPickup.py with comments. It is never put on the micro:bit; see README.txt for what is.
 
 # Import the libraries needed for the application to function.
-from microbit import compass, accelerometer, sleep
-import microbit  # MicroPython API.
-import math  # Need this to use a square root function in finding acceleration.
+import gc  # Used to collect garbage between levels, and to measure what each level allocates.
 import random  # Used to randomly place the pickups.
+from array import array  # A compact, fixed-size buffer of integers.
 
-# Define the max and minimum x and y values that can be used.
-MAX_POSITION = 4
-MIN_POSITION = 0
+try:
+    import microbit  # MicroPython API.
+except ImportError:
+    microbit = None  # Not running on a micro:bit, a backend must be passed to the Game instead.
+
+MAX_POSITION = 4  # The largest x or y value.
 SCREEN_CENTER = 2  # (2,2:x,y) is the center of the screen
-draw_pixel = microbit.display.set_pixel  # A quick macro to reduce statement size needed to turn on an LED.
+GRID_WIDTH = 5  # Cells are numbered row by row, so the cell at x,y is y * GRID_WIDTH + x.
+GRID_HEIGHT = 5
+GRID_CELLS = 25
+PLAYER_CELL_BITS = 5  # Enough bits to store any cell number, 0 to 24.
+SCROLL_COLUMNS_PER_CHARACTER = 6  # Scrolled monospace, each character is 5 columns wide plus a blank column.
+START_CELL = SCREEN_CENTER * GRID_WIDTH + SCREEN_CENTER  # Where the player starts each level.
+PICKUP_BRIGHTNESS = 3  # Set the pickup brightness a bit lower to help the player see which LED they are on.
+# The eight compass directions, clockwise from North in 45 degree steps. A direction is a small integer indexing these,
+# so the game passes it around and looks things up with it rather than comparing letters.
+DIRECTION_NAMES = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+# How far a move in each direction goes along x and y. North is up the display, so it takes y down by one.
+DIRECTION_X = (0, 1, 1, 1, 0, -1, -1, -1)
+DIRECTION_Y = (-1, -1, 0, 1, 1, 1, 0, -1)
+DIRECTION_COUNT = 8  # Must be a power of two, so a direction can be wrapped with a mask.
+DIRECTION_SHIFT = 3  # Multiplying by DIRECTION_COUNT is the same as shifting left by this much.
+NORTH = 0
+NORTH_EAST = 1
+EAST = 2
+SOUTH_EAST = 3
+SOUTH = 4
+SOUTH_WEST = 5
+WEST = 6
+NORTH_WEST = 7
+RESTING_ACCELERATION = 1000  # Acceleration due to gravity, in milli-g.
+STEP_WINDOW = 4  # How many recent accelerometer samples are averaged. Must be a power of two.
+STEP_WINDOW_SHIFT = 2  # Dividing by STEP_WINDOW is the same as shifting right by this much.
+# Times are kept as "ticks", milliseconds that wrap around to 0 after TICKS_MAX, like MicroPython's ticks_ms().
+# Wrapping keeps them small integers, which don't need allocating. Only compare them with ticksDiff.
+TICKS_MAX = (1 << 30) - 1
+TICKS_HALF = 1 << 29
+# Everything that happens to the game arrives as one of these events.
+EVENT_STEP = 1  # The player took a step.
+EVENT_HEADING = 2  # The player turned to face another direction. The value is the direction.
+EVENT_BUTTON_A = 3
+EVENT_BUTTON_B = 4
+EVENT_TIMER = 5  # Something the game was waiting for has finished, such as scrolling text.
+EVENT_QUEUE_SIZE = 16  # Must be a power of two.
+CALIBRATION_TAG = "MPC1"  # The start of a saved calibration. Change it if the format ever changes.
+CALIBRATION_CHECK = 0x5A5A  # Where the checksum of a saved calibration starts from.
+# Raw readings are shifted down before multiplying them together, so every product fits in a small int.
+MAGNETIC_SHIFT = 6  # Nano-tesla, to 64ths.
+ACCELERATION_SHIFT = 3  # Milli-g, to 8ths.
+ANGLE_SHIFT = 10  # The fixed-point fraction bits of the ratio in atan2Degrees.
+ANGLE_ONE = 1 << ANGLE_SHIFT
+ANGLE_LIMIT = 1 << 20  # Larger sides than this are scaled down first, so the ratio can't overflow.
+
+
+# Add a delta in milliseconds to a ticks value.
+def ticksAdd(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+# The milliseconds from start to end, negative if end is before start. Correct across a wrap around.
+def ticksDiff(end, start):
+    return ((end - start + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+# Work out, once, the cell a move from every cell in every direction lands on, so moving is a single lookup. The entry
+# for a cell and direction is at cell * DIRECTION_COUNT + direction. A move off the display is clamped back onto it,
+# so at an edge a cardinal move stays put and a diagonal one slides along the edge.
+def buildNeighbourCells():
+    neighbours = bytearray(GRID_CELLS << DIRECTION_SHIFT)  # One byte per entry, 200 bytes in all.
+
+    for cell in range(GRID_CELLS):
+        x = cell % GRID_WIDTH
+        y = cell // GRID_WIDTH
+        for direction in range(DIRECTION_COUNT):
+            next_x = min(max(x + DIRECTION_X[direction], 0), MAX_POSITION)
+            next_y = min(max(y + DIRECTION_Y[direction], 0), MAX_POSITION)
+            neighbours[cell << DIRECTION_SHIFT | direction] = next_y * GRID_WIDTH + next_x
+
+    return neighbours
+
+
+NEIGHBOUR_CELLS = buildNeighbourCells()
+
+
+# The fixed-point maths used for all the sensor processing. Floats are allocated on the heap in MicroPython, so using
+# them for every sample fills the heap and sets off garbage collection in the middle of a level. Small ints are not.
+# MicroPickupBenchmark.py checks these against float versions on the host and times them.
+
+# The integer square root, rounded down, by Newton's method.
+def isqrt(value):
+    if value <= 0:
+        return 0
+
+    root = 1  # Start from the power of two above the root, so only a few steps are needed.
+    remaining = value
+    while remaining >= 4:
+        remaining >>= 2
+        root <<= 1
+
+    root <<= 1
+    estimate = (root + value // root) >> 1
+    while estimate < root:  # Each estimate is closer, until it stops getting smaller.
+        root = estimate
+        estimate = (root + value // root) >> 1
+
+    return root
+
+
+# Multiply two fixed-point numbers with shift fraction bits, keeping the result in the same scale.
+def fixedMultiply(a, b, shift):
+    return (a * b) >> shift
+
+
+# Move an exponential moving average 1/2**shift of the way towards a new sample.
+def ema(average, sample, shift):
+    return average + ((sample - average) >> shift)
+
 
+# The angle of the point (x, y) in whole degrees from 0 to 359, like math.atan2 but with only integer arithmetic.
+# The angle in the first eighth of a turn is approximated from the ratio of the smaller side to the larger by
+# atan(t) = 45t + t(1 - t)(14.02 + 3.80t) degrees, within a tenth of a degree, then mirrored into the right octant.
+def atan2Degrees(y, x):
+    big = abs(x)
+    small = abs(y)
+    steep = small > big  # Over 45 degrees from the x axis.
+    if steep:
+        big, small = small, big
 
-class Position:  # Position of a GameObject.
-    x = 0
-    y = 0
+    if big == 0:
+        return 0
 
+    while big >= ANGLE_LIMIT:
+        big >>= 1
+        small >>= 1
 
-class GameObject:  # The GameObject parent class of Player and Pickup.
+    ratio = (small << ANGLE_SHIFT) // big  # From 0 to ANGLE_ONE.
+    curve = fixedMultiply(fixedMultiply(ratio, ANGLE_ONE - ratio, ANGLE_SHIFT),
+                          14356 + fixedMultiply(3890, ratio, ANGLE_SHIFT), ANGLE_SHIFT)
+    angle = (45 * ratio + curve + (ANGLE_ONE >> 1)) >> ANGLE_SHIFT  # Rounded to the nearest degree.
 
-    position = Position()
+    if steep:
+        angle = 90 - angle
+    if x < 0:
+        angle = 180 - angle
+    if y < 0:
+        angle = 360 - angle
+
+    return angle % 360
+
+
+# A GameObject's position is the number of the cell it is in, a small int, so it costs no memory of its own and
+# moving is only adding to it.
+class GameObject:  # The GameObject parent class of Player.
+
+    cell = START_CELL
     brightness = 0
 
 
@@ -33,171 +173,930 @@ class Player(GameObject):
 
     # Initiate the class with the following definitions.
     def __init__(self):
-        self.position.x = SCREEN_CENTER  # Place them at the centre of the screen.
-        self.position.y = SCREEN_CENTER
+        self.cell = START_CELL  # Place them at the centre of the screen.
         self.brightness = 9  # The maximum brightness of an LED is 9.
 
     # Reset the player, for use when staring a new level.
     def reset(self):
         self.completion_time = 0
-        self.position.x = SCREEN_CENTER
-        self.position.y = SCREEN_CENTER
+        self.cell = START_CELL
 
-    # Given a cardinal direction, move the player based on that direction.
+    # Given a direction, move the player one cell that way, staying on the display. The direction is masked, so
+    # DIRECTION_COUNT wraps round to North again.
     def move(self, direction):
-        if direction == "N":
-            self.position.y = self.constrainToBoundaries(self.position.y - 1)  # Move up on the display.
-        elif direction == "S":
-            self.position.y = self.constrainToBoundaries(self.position.y + 1)  # Move down.
-        elif direction == "W":
-            self.position.x = self.constrainToBoundaries(self.position.x - 1)  # Move left.
-        elif direction == "E":
-            self.position.x = self.constrainToBoundaries(self.position.x + 1)  # Move right.
-
-    # Turn on the player LED at their x and y position, using their brightness.
-    def draw(self):
-        draw_pixel(self.position.x, self.position.y, self.brightness)
+        self.cell = NEIGHBOUR_CELLS[self.cell << DIRECTION_SHIFT | direction & (DIRECTION_COUNT - 1)]
+
+    # Put the player in the frame in their cell, using their brightness.
+    def draw(self, frame):
+        frame[self.cell] = self.brightness
+
+
+# The pickups on the display, kept as a struct of arrays: the cell and brightness of each pickup are at the same index
+# of two fixed-size bytearrays, and only the first count are in use. Nothing is allocated per pickup, however many
+# there are. A bitmask of the cells with a pickup is kept as well, for checking a cell without searching.
+class PickupStore:
+
+    def __init__(self):
+        self.cells = bytearray(GRID_CELLS)
+        self.brightness = bytearray(GRID_CELLS)
+        self.count = 0
+        self.mask = 0  # One bit per cell of the display, set where there is a pickup.
+
+    # Remove every pickup.
+    def clear(self):
+        self.count = 0
+        self.mask = 0
+
+    # Add a pickup. There must be room for it, which there always is, as there is one cell per pickup at most.
+    def add(self, cell, brightness):
+        index = self.count
+        self.cells[index] = cell
+        self.brightness[index] = brightness
+        self.count = index + 1
+        self.mask |= 1 << cell
+
+    # Remove the pickup in a cell, if there is one. Returns whether there was.
+    # The last pickup is moved into its place, so nothing after it has to be shuffled down.
+    def remove(self, cell):
+        if not self.mask >> cell & 1:
+            return False
+
+        cells = self.cells
+        index = 0
+        while cells[index] != cell:
+            index += 1
+
+        last = self.count - 1
+        cells[index] = cells[last]
+        self.brightness[index] = self.brightness[last]
+        self.count = last
+        self.mask &= ~(1 << cell)
+
+        return True
+
+    # Put the pickups in the frame.
+    def draw(self, frame):
+        cells = self.cells
+        brightness = self.brightness
+
+        for index in range(self.count):
+            frame[cells[index]] = brightness[index]
+
+
+# Turns a fast stream of accelerometer samples into discrete steps.
+# Samples are averaged over a small ring buffer to smooth out noise. A step is counted at the top of each peak
+# in acceleration, then no more are counted until the acceleration has fallen back halfway towards resting
+# (hysteresis), and never sooner than refractory_period after the last step. One long stride is one step.
+class StepDetector:
+    refractory_period = 250  # The shortest time between two steps, in milliseconds.
+
+    def __init__(self):
+        self.samples = array("l", [0] * STEP_WINDOW)  # The ring buffer of squared accelerations.
+        self.index = 0  # Where the next sample goes in the ring buffer.
+        self.total = 0  # The sum of everything in the ring buffer.
+        self.high = 0  # The squared acceleration a peak must rise above.
+        self.low = 0  # The squared acceleration it must fall below before the next peak.
+        self.in_peak = False
+        self.peak_found = False  # Whether the current peak has already been counted.
+        self.peak = 0  # The highest average seen in the current peak.
+        self.last_step_time = 0
+        self.last_active_time = 0  # The last time the acceleration was above resting.
+        self.steps = 0  # Steps taken that the game has not used yet.
+
+    # Set the acceleration a step must reach, in milli-g.
+    def setThreshold(self, threshold):
+        low = (threshold + RESTING_ACCELERATION) // 2  # Halfway back to resting, which is always reachable.
+        self.high = threshold * threshold
+        self.low = low * low
+
+    # Forget any steps taken so far, for use when starting a new level.
+    def reset(self, now):
+        self.in_peak = False
+        self.last_step_time = ticksAdd(now, -self.refractory_period)
+        self.last_active_time = now
+        self.steps = 0
+
+    # Add a squared acceleration sample taken at the time now.
+    def sample(self, acceleration_squared, now):
+        index = self.index
+        self.total += acceleration_squared - self.samples[index]  # Swap the oldest sample out of the total.
+        self.samples[index] = acceleration_squared
+        self.index = (index + 1) & (STEP_WINDOW - 1)  # Wrap around to the start of the buffer.
+        level = self.total >> STEP_WINDOW_SHIFT  # The average of the buffer.
+
+        if level > self.low:  # Any movement at all, even if it isn't enough to be a step.
+            self.last_active_time = now
+
+        if not self.in_peak:
+            if level > self.high:  # A new peak has started.
+                self.in_peak = True
+                self.peak_found = False
+                self.peak = level
+        elif level < self.low:  # The peak is over, be ready for the next one.
+            self.in_peak = False
+        elif not self.peak_found:
+            if level < self.peak:  # Falling, so the last sample was the top of the peak.
+                self.peak_found = True
+                if ticksDiff(now, self.last_step_time) >= self.refractory_period:
+                    self.last_step_time = now
+                    self.steps += 1
+            else:
+                self.peak = level  # Still rising.
+
+    # Get the amount of steps taken since this was last called.
+    def takeSteps(self):
+        steps = self.steps
+        self.steps = 0
+
+        return steps
+
+
+# Calibrates the compass a sample at a time, in the background, instead of blocking the game until the user has tilted
+# the board round in a circle. Fields from the board itself (hard iron) shift every reading by the same offset, so the
+# true centre of the readings is halfway between the smallest and largest seen on each axis.
+# Calibration is done once readings have been seen in all eight octants of a full turn, and each axis has spanned at
+# least minimum_span nano-tesla, the Earth's field being around 50000.
+class CompassCalibrator:
+    minimum_span = 20000
+
+    def __init__(self):
+        self.reset()
+
+    # Forget everything, and start calibrating again.
+    def reset(self):
+        self.calibrated = False
+        self.samples = 0
+        self.octants = 0  # One bit per octant of a turn that has been seen.
+        self.min_x = 0
+        self.max_x = 0
+        self.min_y = 0
+        self.max_y = 0
+        self.min_z = 0
+        self.max_z = 0
+        self.offset_x = 0  # The hard-iron offsets, settled once calibrated.
+        self.offset_y = 0
+        self.offset_z = 0
+
+    # Add a raw reading of the magnetic field, in nano-tesla.
+    def sample(self, x, y, z):
+        if self.samples == 0:  # The first sample is both the smallest and largest so far.
+            self.min_x = self.max_x = x
+            self.min_y = self.max_y = y
+            self.min_z = self.max_z = z
+
+        self.samples += 1
+
+        if x < self.min_x:
+            self.min_x = x
+        elif x > self.max_x:
+            self.max_x = x
+        if y < self.min_y:
+            self.min_y = y
+        elif y > self.max_y:
+            self.max_y = y
+        if z < self.min_z:
+            self.min_z = z
+        elif z > self.max_z:
+            self.max_z = z
+
+        if self.calibrated:  # Keep widening the range, but the offsets are settled.
+            return
+
+        # Until then, the best guess at the offsets is the centre of the readings so far, which gets better as the
+        # user turns.
+        self.offset_x = (self.min_x + self.max_x) >> 1
+        self.offset_y = (self.min_y + self.max_y) >> 1
+        self.offset_z = self.getCentreZ()
+        x -= self.offset_x  # Centre the reading.
+        y -= self.offset_y
+        octant = 0  # Which eighth of a turn the reading is in, from its signs and which axis is larger.
+        if y < 0:
+            octant |= 4
+        if x < 0:
+            octant |= 2
+        if abs(x) < abs(y):
+            octant |= 1
+        self.octants |= 1 << octant
+
+        if self.octants == 0xFF and self.max_x - self.min_x >= self.minimum_span:  # A full turn has been seen.
+            if self.max_y - self.min_y >= self.minimum_span:
+                self.calibrated = True
+
+    # Get the centre of the z readings. Turning round flat doesn't change z, so until the board has also been tilted
+    # far enough to tell, there is no offset to be found, and none is assumed.
+    def getCentreZ(self):
+        if self.max_z - self.min_z < self.minimum_span:
+            return 0
+
+        return (self.min_z + self.max_z) >> 1
+
+    # Get a 16 bit checksum of the saved values, so a half-written or corrupted file is never used.
+    def getChecksum(self, values):
+        check = CALIBRATION_CHECK
+        for value in values:
+            check = (check * 31 + value) & 0xFFFF
+
+        return check
+
+    # Save the smallest and largest reading on each axis to the micro:bit's filesystem, so the next power up doesn't
+    # need to calibrate again. The offsets follow from them. If the filesystem is full, it just won't be saved.
+    def save(self, filename):
+        values = (self.min_x, self.max_x, self.min_y, self.max_y, self.min_z, self.max_z)
+        fields = [CALIBRATION_TAG]
+        for value in values:
+            fields.append(str(value))
+        fields.append(str(self.getChecksum(values)))
+
+        try:
+            with open(filename, "w") as file:
+                file.write(",".join(fields))
+        except OSError:
+            pass
+
+    # Load a saved calibration. Returns whether it was loaded, which it isn't if there is no file, or it isn't valid.
+    def load(self, filename):
+        try:
+            with open(filename) as file:
+                fields = file.read().split(",")
+        except OSError:  # No saved calibration.
+            return False
+
+        if len(fields) != 8 or fields[0] != CALIBRATION_TAG:
+            return False
+
+        try:
+            values = [int(field) for field in fields[1:]]
+        except ValueError:
+            return False
+
+        check = values.pop()
+        if check != self.getChecksum(values):
+            return False
+
+        # It must also be a calibration that could have been finished.
+        min_x, max_x, min_y, max_y, min_z, max_z = values
+        if max_x - min_x < self.minimum_span or max_y - min_y < self.minimum_span or max_z < min_z:
+            return False
+
+        self.reset()
+        self.min_x = min_x
+        self.max_x = max_x
+        self.min_y = min_y
+        self.max_y = max_y
+        self.min_z = min_z
+        self.max_z = max_z
+        self.samples = 1
+        self.octants = 0xFF
+        self.offset_x = (min_x + max_x) >> 1
+        self.offset_y = (min_y + max_y) >> 1
+        self.offset_z = self.getCentreZ()
+        self.calibrated = True
+
+        return True
+
+
+# Works out the heading from the centred magnetic field and the acceleration, however the board is tilted, and
+# smooths it so that one noisy reading near the edge of a direction doesn't turn the player.
+# The heading is an angle, so it can't be averaged directly: 359 and 1 would average to 180. Instead the direction
+# north lies in, as an (east, north) vector, is smoothed with an exponential moving average, and the angle taken after.
+class HeadingFilter:
+    smoothing_shift = 1  # Each sample moves the smoothed vector half way towards it, as samples come at 10 Hz.
+
+    def __init__(self):
+        self.reset()
 
-    # When the player wants to move, check if that movement would put them outside the boundaries.
-    @staticmethod
-    def constrainToBoundaries(value):
-        if value < MIN_POSITION:
-            return MIN_POSITION
-        if value > MAX_POSITION:
-            return MAX_POSITION
+    # Forget the smoothed heading, such as when the calibration changes.
+    def reset(self):
+        self.east = 0
+        self.north = 0
+        self.primed = False  # Whether there has been a sample to start from.
+
+    # Add a centred reading of the field in nano-tesla, and the acceleration in milli-g, taken at the same time.
+    # Gravity gives which way is up, so east is across both the field and up, and north is across up and east.
+    # The heading is then the angle of the board's y axis between the two, the same way Android works it out.
+    # Flat and facing north the field points along +y, and the accelerometer reads -1000 milli-g along z.
+    def sample(self, mx, my, mz, ax, ay, az):
+        mx >>= MAGNETIC_SHIFT
+        my >>= MAGNETIC_SHIFT
+        mz >>= MAGNETIC_SHIFT
+        ux = -ax >> ACCELERATION_SHIFT  # Up is against the reading.
+        uy = -ay >> ACCELERATION_SHIFT
+        uz = -az >> ACCELERATION_SHIFT
+        up_squared = ux * ux + uy * uy + uz * uz
+
+        if up_squared == 0:  # Falling, so there is no up to go by.
+            return
+
+        east_x = my * uz - mz * uy  # The field crossed with up.
+        east_y = mz * ux - mx * uz
+        east_z = mx * uy - my * ux
+        north_y = uz * east_x - ux * east_z  # Up crossed with east. Only the y part is needed.
+        # Divide out the length of up, once for east and twice for north, so every sample has the same weight however
+        # hard the user is stepping.
+        east = (east_y << 2) // isqrt(up_squared)
+        north = (north_y << 2) // up_squared
+
+        if self.primed:
+            self.east = ema(self.east, east, self.smoothing_shift)
+            self.north = ema(self.north, north, self.smoothing_shift)
+        else:
+            self.east = east
+            self.north = north
+            self.primed = True
 
-        return value
+    # Get the smoothed heading in degrees clockwise from north.
+    def heading(self):
+        return atan2Degrees(self.east, self.north)
 
 
-# The pick-up object that players need to move over.
-class Pickup(GameObject):
+# A first in, first out queue of events, each with a small value, in a fixed-size ring buffer.
+# If the queue is full, new events are dropped and counted rather than growing the queue.
+class EventQueue:
 
     def __init__(self):
-        self.position = Position()
-        self.position.x = random.randrange(MAX_POSITION + 1)  # Set their x to a random value between 0 and 4.
-        self.position.y = random.randrange(MAX_POSITION + 1)  # Set their y to a random value between 0 and 4.
-        self.brightness = 3  # Set the pickup brightness a bit lower to help the player see which LED they are on.
+        self.events = bytearray(EVENT_QUEUE_SIZE)
+        self.values = bytearray(EVENT_QUEUE_SIZE)
+        self.head = 0  # Where the oldest event is.
+        self.length = 0  # How many events are waiting.
+        self.value = 0  # The value of the event last popped.
+        self.dropped = 0
+
+    def push(self, event, value=0):
+        if self.length == EVENT_QUEUE_SIZE:
+            self.dropped += 1
+            return
+
+        index = (self.head + self.length) & (EVENT_QUEUE_SIZE - 1)  # The first free space, wrapping around.
+        self.events[index] = event
+        self.values[index] = value
+        self.length += 1
+
+    # Take the oldest event off the queue. Its value is left in self.value, so no tuple needs allocating.
+    def pop(self):
+        index = self.head
+        self.value = self.values[index]
+        self.head = (index + 1) & (EVENT_QUEUE_SIZE - 1)
+        self.length -= 1
+
+        return self.events[index]
+
+    def clear(self):
+        self.head = 0
+        self.length = 0
+
+
+# Runs tasks cooperatively, in the style of uasyncio. A task is a generator that does some work, then yields how many
+# milliseconds it wants to sleep for. Each task has a deadline for when it is next due: the scheduler sleeps until the
+# soonest one, then runs that task. Deadlines are kept on a fixed timestep, so the time spent working doesn't make
+# the tasks drift. A task that finds itself a whole period behind counts an overrun and starts again from now,
+# rather than rushing to catch up.
+class Scheduler:
+
+    def __init__(self, ticks, sleep):
+        self.ticks = ticks
+        self.sleep = sleep
+        self.tasks = []  # None once a task has finished.
+        self.deadlines = []
+        self.overruns = 0
+        self.steps = 0  # How many times a task has been resumed. MicroPickupBenchmark.py reports bytes per step.
+
+    # Add a task, due straight away. Returns its index, for use with wake and run.
+    def spawn(self, task):
+        self.tasks.append(task)
+        self.deadlines.append(self.ticks())
+
+        return len(self.tasks) - 1
+
+    # Make a sleeping task due straight away.
+    def wake(self, index):
+        self.deadlines[index] = self.ticks()
+
+    # Run the tasks until the main task has finished, then stop the rest.
+    def run(self, main_index):
+        tasks = self.tasks
+        deadlines = self.deadlines
+        ticks = self.ticks  # Looked up once, rather than on every pass of the loop.
+        sleep = self.sleep
+
+        while True:
+            index = -1  # Find the task due soonest.
+            for candidate in range(len(tasks)):
+                if tasks[candidate] is not None:
+                    if index < 0 or ticksDiff(deadlines[candidate], deadlines[index]) < 0:
+                        index = candidate
+
+            deadline = deadlines[index]
+            wait = ticksDiff(deadline, ticks())  # Only sleep for what is left until it is due.
+            if wait > 0:
+                sleep(wait)
+
+            try:
+                delay = next(tasks[index])
+            except StopIteration:
+                tasks[index] = None
+                if index == main_index:
+                    break
+                continue
+
+            self.steps += 1
+            now = ticks()
+            deadline = ticksAdd(deadline, delay)
+            if ticksDiff(deadline, now) <= 0:
+                self.overruns += 1
+                deadline = ticksAdd(now, delay)
+            deadlines[index] = deadline
+
+        for task in tasks:
+            if task is not None:
+                task.close()
+
+        self.tasks = []
+        self.deadlines = []
+
 
 # The main controller class.
 class Game:
-    player = Player()  # Instantiate a player object.
-    pickups = []  # Instantiate a container for the pickups to be stored in.
     game_running = True  # Start the game running. (Will always be true, no functionality is provided to quit.)
+    level_running = False  # Whether a level is being played, rather than text being shown before or after it.
     acceleration_needed_to_move = 1200  # The acceleration that the user must reach to move the player.
+    image_cache_size = 8  # How many drawn frames to keep. Each one is a 5x5 Image.
+    scroll_end_time = 0  # When the text being scrolled will have left the display.
+    scrolling = False  # Set until the end of the scroll has been sent as an event.
+    facing = 0  # The direction the player is facing.
+    sensed_facing = -1  # The direction last sent as an event. -1 means none has been sent.
+    frame_dirty = True  # Whether anything has changed since the display was last drawn.
+    # How often, in milliseconds, the accelerometer is sampled, the game is updated and the display is drawn.
+    sense_period = 20
+    logic_period = 100
+    render_period = 100
+    heading_period = 100  # How often the compass is read while the player is moving, the same rate as the logic.
+    next_heading_time = 0  # When the compass is next due to be read.
+    # When the player hasn't moved for idle_after milliseconds, slow everything down to save battery.
+    idle_after = 5000
+    idle_sense_period = 100
+    idle_logic_period = 500
+    idle_render_period = 500
+    idle = False
+    mode_start_time = 0  # When the game last went idle or active.
+    active_time = 0  # The total milliseconds spent active.
+    idle_time = 0  # The total milliseconds spent idle.
+    idle_count = 0  # How many times the game has gone idle.
+    # The last acceleration read, in milli-g, which also gives the tilt of the board for the heading.
+    acceleration_x = 0
+    acceleration_y = 0
+    acceleration_z = -RESTING_ACCELERATION  # Flat, until the first read.
+    calibration_period = 100  # How often, in milliseconds, the compass is sampled while it is being calibrated.
+    use_builtin_heading = False  # Whether the device's own calibration can be used until ours is done.
+    facing_hysteresis = 15  # Degrees past the edge of a direction the heading must go before the player turns.
+    eight_way = False  # Whether the player can also move diagonally, rather than only North, East, South and West.
+    calibration_file = "calibration.txt"  # Where the calibration is kept between power ups. None to not keep it.
+    calibration_loaded = False  # Whether a saved calibration was loaded.
+    calibration_saved = False  # Whether the current calibration has been saved.
+    starting_pickup_amount = 4  # The amount of pickups on the first level.
+    pickup_amount_increase = 1  # How many more pickups each following level has.
+    levels_completed = 0  # Read by the simulator to know when to stop.
+    last_level_time = 0  # The time taken to complete the previous level, in milliseconds.
+    # The bytes of heap the previous level allocated, and how many levels have allocated anything. Once the game is
+    # running both should stay at zero. Only measured where gc.mem_alloc exists, as in MicroPython, where
+    # MicroPickupBenchmark.py plays whole levels and fails if any level after the first allocates.
+    last_level_allocated = 0
+    last_level_steps = 0  # How many task steps the previous level took. The benchmark divides the bytes by these.
+    allocating_levels = 0
+
+    # The backend provides the hardware: display, compass, accelerometer, buttons, running_time and sleep.
+    # Anything with the same names as the microbit module will do, such as the simulator's Backend.
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = microbit  # Default to the real hardware.
+
+        self.display = backend.display
+        self.compass = backend.compass
+        self.accelerometer = backend.accelerometer
+        self.button_a = backend.button_a
+        self.button_b = backend.button_b
+        self.running_time = backend.running_time
+        self.sleep = backend.sleep
+        self.Image = backend.Image
+        self.frame = bytearray(GRID_CELLS)  # The brightness of every LED in the frame being drawn.
+        self.player = Player()
+        self.pickups = PickupStore()
+        self.drawn_frame_key = -1  # What the frame on the display was drawn from. -1 means it needs drawing.
+        self.images = {}  # Recently drawn frames, ready to show again, by frame key.
+        self.image_keys = []  # The frame keys in the image cache, least recently shown first.
+        # Images for the cache, made up front and drawn over again, so drawing allocates nothing.
+        self.free_images = [self.Image(GRID_WIDTH, GRID_HEIGHT) for index in range(self.image_cache_size)]
+        self.memory_used = getattr(gc, "mem_alloc", None)  # Bytes allocated on the heap. Can be swapped.
+        self.step_detector = StepDetector()
+        self.events = EventQueue()
+        self.calibrator = CompassCalibrator()
+        self.heading_filter = HeadingFilter()
+        self.scheduler = Scheduler(self.ticks, self.sleep)  # Can be swapped for another with the same methods.
+        self.logic_task = -1  # The scheduler's indexes of the tasks that are woken when the player moves.
+        self.render_task = -1
+        # Every cell a pickup can spawn in, which is all of them except where the player starts. Shuffled in place.
+        self.spawn_cells = bytearray(cell for cell in range(GRID_CELLS) if cell != START_CELL)
 
-    def __init__(self):
         self.setup()  # Run essential setup.
 
-    # Spawn the pickups around the display.
+    # Spawn the pickups around the display, never two in the same cell or one where the player starts.
+    # A partial Fisher-Yates shuffle: each pickup picks a random cell from those not yet used, and that cell is swapped
+    # to the front so it can't be picked again. There can't be more pickups than cells to put them in.
     def spawnPickups(self, amount):
-        self.pickups.clear()  # Make sure the pickup container is empty before spawning new ones.
+        spawn_cells = self.spawn_cells
+        cell_amount = len(spawn_cells)
+        pickups = self.pickups
+        pickups.clear()  # Make sure there are no pickups left before spawning new ones.
 
-        for x in range(amount):  # Do this operation the amount of times passed in to the function.
-            new_pickup = Pickup()  # Instantiate a new pickup.
+        if amount > cell_amount:
+            amount = cell_amount
 
-            self.pickups.append(new_pickup)  # Add it to the pickup container for storage and later processing.
+        for index in range(amount):  # Do this operation the amount of times passed in to the function.
+            swap_index = random.randrange(index, cell_amount)  # Pick one of the unused cells.
+            cell = spawn_cells[swap_index]
+            spawn_cells[swap_index] = spawn_cells[index]
+            spawn_cells[index] = cell
+            pickups.add(cell, PICKUP_BRIGHTNESS)  # Place a pickup in it.
 
-    # Display the pickups on the screen.
-    def drawPickups(self):
-        for pickup in self.pickups:  # For each pickup stored in the pickup container.
-            draw_pixel(pickup.position.x, pickup.position.y, pickup.brightness) # Turn on the LED at their position.
+    # Put the pickups in the frame.
+    def drawPickups(self, frame):
+        self.pickups.draw(frame)
 
-    # Get the approximate facing direction of the user.
+    # Get the approximate facing direction of the user, reading the compass only once. The compass is split into four
+    # 90 degree sectors, or eight 45 degree ones when moving diagonally, each centred on its direction.
+    # The direction last sensed is kept until the heading is facing_hysteresis degrees past its edge, so a heading
+    # wavering around 45 degrees doesn't flip between north and east.
     def findApproxFacingDirection(self):
-        cardinal_direction = ""
+        heading = self.getHeading()
+        facing = self.sensed_facing
+
+        if self.eight_way:
+            sector = 45
+            step = 1  # Every direction.
+        else:
+            sector = 90
+            step = 2  # Only every other direction, the cardinal ones.
+        half_sector = sector // 2
+
+        if facing >= 0:
+            difference = (heading - facing * 45 + 180) % 360 - 180  # From -180 to 179 degrees away.
+            if -half_sector - self.facing_hysteresis <= difference <= half_sector + self.facing_hysteresis:
+                return facing
+
+        # Offset by half a sector so each is centred on its direction. Headings just short of 360 come out as
+        # DIRECTION_COUNT, which the mask wraps round to North.
+        return (heading + half_sector) // sector * step & (DIRECTION_COUNT - 1)
+
+    # Get the smoothed heading in degrees clockwise from north, corrected for tilt by the last acceleration read, so
+    # there is only the one accelerometer read per sample. Every reading also helps calibrate.
+    def getHeading(self):
+        calibrator = self.calibrator
 
-        if compass.heading() > 315 or compass.heading() < 45:
-            cardinal_direction = "N"
-        elif compass.heading() > 225 and compass.heading() < 315:
-            cardinal_direction = "W"
-        elif compass.heading() > 135 and compass.heading() < 225:
-            cardinal_direction = "S"
-        elif compass.heading() > 45 and compass.heading() < 135:
-            cardinal_direction = "E"
+        if self.use_builtin_heading and not calibrator.calibrated:
+            return self.compass.heading()  # Only when the device is already calibrated, or it would block.
 
-        return cardinal_direction
+        x = self.compass.get_x()
+        y = self.compass.get_y()
+        z = self.compass.get_z()
+        calibrator.sample(x, y, z)
 
-    # Get the current acceleration of the user. Resting acceleration is a value of 1000 milli-g, acceleration due to gravity.
-    def getAcceleration(self):
+        heading_filter = self.heading_filter
+        heading_filter.sample(x - calibrator.offset_x, y - calibrator.offset_y, z - calibrator.offset_z,
+                              self.acceleration_x, self.acceleration_y, self.acceleration_z)
+
+        return heading_filter.heading()
+
+    # Get the current acceleration of the user, squared. Resting acceleration is a value of 1000 milli-g, acceleration due to gravity.
+    # Each axis is read on its own, as get_values would allocate a tuple, and only integer multiplication is used, so
+    # nothing is allocated. The axes are kept for the heading.
+    def getAccelerationSquared(self):
+        accelerometer = self.accelerometer
         x = accelerometer.get_x()
         y = accelerometer.get_y()
         z = accelerometer.get_z()
+        self.acceleration_x = x
+        self.acceleration_y = y
+        self.acceleration_z = z
 
-        acceleration = math.sqrt(x ** 2 + y ** 2 + z ** 2)  # ** means make this a power of.
-
-        return acceleration
+        return x * x + y * y + z * z
 
-    @staticmethod
-    def setup():
-        if not compass.is_calibrated():  # The compass must be calibrated for the application to function correctly.
-            compass.calibrate()
+    # The compass is calibrated in the background while the user plays, rather than blocking here until it is.
+    def setup(self):
+        self.use_builtin_heading = self.compass.is_calibrated()
 
-    # Check if the player is on top of a pickup.
+    # Check if the player is on top of a pickup, and pick it up if they are.
     def update(self):
-        for pickup in self.pickups:
-            if pickup.position.x == self.player.position.x:
-                if pickup.position.y == self.player.position.y:
-                    self.pickups.remove(pickup)
+        self.pickups.remove(self.player.cell)
 
     # Start the level.
     def startLevel(self, pickup_amount):
+        self.step_detector.setThreshold(self.acceleration_needed_to_move)  # Pick up any change since the last level.
 
         self.spawnPickups(pickup_amount)
         self.player.reset()
 
-        microbit.display.clear()  # Turn off all LEDs.
+        self.drawn_frame_key = -1  # Draw the new level as soon as the display is free.
+        self.frame_dirty = True
+
+    # Read the compass, and send an event if the user is facing a different direction to last time.
+    def senseHeading(self):
+        facing = self.findApproxFacingDirection()
+
+        if facing != self.sensed_facing:
+            self.sensed_facing = facing
+            self.events.push(EVENT_HEADING, facing)
 
+    # Sample the accelerometer, and send an event for each step taken.
+    # The compass is read every heading_period while the player is moving, so the heading is smoothed over time, and
+    # on every step so it is never out of date. While idle it is left alone, to save power, until they step again.
+    def senseSteps(self, now):
+        step_detector = self.step_detector
+        step_detector.sample(self.getAccelerationSquared(), now)
+        steps = step_detector.takeSteps()
+
+        if steps or not self.idle and ticksDiff(now, self.next_heading_time) >= 0:
+            self.next_heading_time = ticksAdd(now, self.heading_period)
+            self.senseHeading()  # Comes before the steps, so they are taken in the right direction.
+
+        if steps and self.level_running:  # Steps between levels don't count, so don't fill the queue with them.
+            for step in range(steps):
+                self.events.push(EVENT_STEP)
+
+    # Send events for the buttons.
     def getInput(self):
-        direction = self.findApproxFacingDirection()  # Get the direction the user is facing.
+        if self.button_b.was_pressed():
+            self.events.push(EVENT_BUTTON_B)
+        elif self.button_a.was_pressed():
+            self.events.push(EVENT_BUTTON_A)
+
+    # Apply every waiting event to the game, in the order they happened. The game only changes here, so replaying
+    # the same events plays the same game.
+    def handleEvents(self):
+        events = self.events
+
+        while events.length:
+            event = events.pop()
 
-        if self.getAcceleration() > self.acceleration_needed_to_move:  # If they are moving fast enough.
-            self.player.move(direction)   # Move them in that direction.
+            if event == EVENT_STEP:
+                self.player.move(self.facing)  # Move them in the direction they are facing.
+                self.update()  # After every step, so one taken straight after another can't skip a pickup.
+            elif event == EVENT_HEADING:
+                self.facing = events.value
+            elif event == EVENT_BUTTON_B:
+                scroll_delay = 100
+                self.scrollText(DIRECTION_NAMES[self.facing], scroll_delay)  # Show "N" or "NE" for example.
+            elif event == EVENT_BUTTON_A:  # Start calibrating again, such as after moving somewhere new.
+                self.calibrator.reset()
+                self.heading_filter.reset()  # The old offsets were in it.
+                self.use_builtin_heading = False
+                self.calibration_saved = False  # Save the new calibration over the old one once it is done.
 
-        if microbit.button_b.was_pressed():
-            scroll_delay = 100
-            microbit.display.scroll(self.findApproxFacingDirection(), scroll_delay)  # Show "N" for example.
-        elif microbit.button_a.was_pressed():
-            compass.calibrate()
+        self.frame_dirty = True
 
+    # Get the current time in ticks.
+    def ticks(self):
+        return self.running_time() & TICKS_MAX
+
+    # Scroll text across the display in the background, so the game keeps sensing and playing while it is shown.
+    # Monospaced text scrolls for a known time, so the end of the scroll can be worked out without asking the display.
+    def scrollText(self, text, delay=150):
+        self.display.scroll(text, delay, wait=False, monospace=True)
+        self.scrolling = True
+        self.drawn_frame_key = -1  # The text replaces the frame, so it must all be drawn again afterwards.
+        duration = (len(text) * SCROLL_COLUMNS_PER_CHARACTER + GRID_WIDTH) * delay
+        self.scroll_end_time = ticksAdd(self.ticks(), duration)
+
+    def isScrolling(self):
+        return ticksDiff(self.scroll_end_time, self.ticks()) > 0
+
+    # Go idle if there hasn't been any movement for a while, or active again as soon as there is.
+    # Returns True if the game has just become active.
+    def updatePowerMode(self, now):
+        idle = ticksDiff(now, self.step_detector.last_active_time) >= self.idle_after
+        elapsed = ticksDiff(now, self.mode_start_time)
+        self.mode_start_time = now
+
+        if self.idle:
+            self.idle_time += elapsed
+        else:
+            self.active_time += elapsed
+
+        if idle == self.idle:
+            return False
+
+        self.idle = idle
+        if idle:
+            self.idle_count += 1
+
+        return not idle
+
+    # Show the whole frame on the display in one go. If nothing has moved since the last frame, the display isn't
+    # touched at all. Everything on the display is given by the pickups and the player's cell, so together they are
+    # the frame key.
     def draw(self):
-        microbit.display.clear()
-        self.drawPickups()
-        self.player.draw()
+        frame_key = self.pickups.mask << PLAYER_CELL_BITS | self.player.cell
+
+        if frame_key == self.drawn_frame_key:
+            return
+
+        self.drawn_frame_key = frame_key
+        self.display.show(self.getFrameImage(frame_key))
+
+    # Get the Image for a frame key, from the cache if it has been drawn recently. When the cache is full, the Image of
+    # the frame that was shown longest ago is drawn over with the new one.
+    def getFrameImage(self, frame_key):
+        images = self.images
+        image_keys = self.image_keys
+        image = images.get(frame_key)
+
+        if image is None:
+            frame = self.frame
+            for cell in range(GRID_CELLS):
+                frame[cell] = 0
+
+            self.drawPickups(frame)
+            self.player.draw(frame)
+
+            if len(image_keys) >= self.image_cache_size:
+                image = images.pop(image_keys.pop(0))
+            elif self.free_images:
+                image = self.free_images.pop()
+            else:  # Only if image_cache_size was made larger after starting.
+                image = self.Image(GRID_WIDTH, GRID_HEIGHT)
+
+            cell = 0
+            for y in range(GRID_HEIGHT):
+                for x in range(GRID_WIDTH):
+                    image.set_pixel(x, y, frame[cell])
+                    cell += 1
+
+            images[frame_key] = image
+        else:
+            image_keys.remove(frame_key)
+
+        image_keys.append(frame_key)  # Now the most recently shown.
+
+        return image
+
+    # Get the bytes allocated on the heap, or 0 if that can't be measured.
+    def getMemoryUsed(self):
+        if self.memory_used is None:
+            return 0
+
+        return self.memory_used()
 
     def isGameOver(self):
-        is_pickups_empty = len(self.pickups) < 1  # Check if the pickup container is empty.
+        is_pickups_empty = self.pickups.count == 0  # Check if there are no pickups left.
 
         if is_pickups_empty:
             return True
         else:
             return False
 
-    def playGame(self):
-        microbit.display.scroll("WALK TO PICK UP ITEMS.")
+    # The sensor task. Samples the accelerometer for steps, and wakes the other tasks up once the player moves again.
+    # While idle, every task runs at the slower idle periods.
+    # The methods called every tick are looked up once, into locals, before the loop.
+    def senseTask(self):
+        scheduler = self.scheduler
+        ticks = self.ticks
+        sense_steps = self.senseSteps
+        update_power_mode = self.updatePowerMode
+        self.next_heading_time = ticks()
+
+        while True:
+            now = ticks()
+            sense_steps(now)
+
+            if update_power_mode(now):  # Woken up, so everything is due now.
+                scheduler.wake(self.logic_task)
+                scheduler.wake(self.render_task)
+
+            if self.idle:
+                yield self.idle_sense_period
+            else:
+                yield self.sense_period
+
+    # Load the calibration saved at the last power up, if there is a valid one, so the heading is right straight away.
+    def loadCalibration(self):
+        if self.calibration_file and self.calibrator.load(self.calibration_file):
+            self.calibration_loaded = True
+            self.calibration_saved = True  # Already saved, so don't write it back.
+
+    # The calibration task. Saves the calibration once it is done, then only checks back in now and then in case it
+    # has been reset. Every heading read already samples the compass for calibration, so this only samples it while
+    # the device's own calibration is giving the heading instead.
+    def calibrationTask(self):
+        compass = self.compass
+        calibrator = self.calibrator
+
+        while True:
+            if calibrator.calibrated:
+                if not self.calibration_saved and self.calibration_file:  # Only write to flash once per calibration.
+                    calibrator.save(self.calibration_file)
+                    self.calibration_saved = True
+                yield self.idle_logic_period
+            elif self.idle or not self.use_builtin_heading:
+                yield self.idle_logic_period
+            else:
+                calibrator.sample(compass.get_x(), compass.get_y(), compass.get_z())
+                yield self.calibration_period
+
+    # The renderer task. Only draws when something has changed, and never over scrolling text.
+    def renderTask(self):
+        is_scrolling = self.isScrolling
+        draw = self.draw
+
+        while True:
+            if self.frame_dirty and not is_scrolling():  # Showing a frame would stop the text.
+                self.frame_dirty = False
+                draw()
+
+            if self.idle:
+                yield self.idle_render_period
+            else:
+                yield self.render_period
 
-        pickup_amount = 4
+    # The text task. Sleeps until the scrolling text has gone, then sends an event to say so.
+    def textTask(self):
+        while True:
+            if self.scrolling:
+                wait = ticksDiff(self.scroll_end_time, self.ticks())
+                if wait > 0:
+                    yield wait
+                    continue
+
+                self.scrolling = False
+                self.events.push(EVENT_TIMER)
+
+            yield self.logic_period
+
+    # The game logic task. Plays each level until every pickup has been picked up, updating the game only when
+    # something has happened. Finishes once the game stops running.
+    def logicTask(self):
+        events = self.events
+        is_game_over = self.isGameOver
+        get_input = self.getInput
+        handle_events = self.handleEvents
+
+        self.scrollText("WALK TO PICK UP ITEMS.")
+
+        pickup_amount = self.starting_pickup_amount
 
         while self.game_running:
 
-            self.startLevel(pickup_amount)
-            level_start_time = microbit.running_time()  # Store the time when the user starts a level.
+            self.startLevel(pickup_amount)  # Get the level ready while any text is still scrolling.
+            gc.collect()  # Collect now, while the user is reading, so it doesn't happen in the middle of the level.
+            while self.isScrolling():
+                yield ticksDiff(self.scroll_end_time, self.ticks())
 
-            # Execute a traditional game loop.
-            while not self.isGameOver():
-                self.getInput()
-                self.update()
-                self.draw()
+            level_start_time = self.ticks()  # Store the time when the user starts a level.
+            self.step_detector.reset(level_start_time)  # Steps taken between levels don't count.
+            events.clear()  # Nor does anything else.
+            self.level_running = True
+            self.sensed_facing = -1  # So the next direction is sent again, in case it was cleared.
+            level_start_steps = self.scheduler.steps
+            level_start_memory = self.getMemoryUsed()
 
-                if self.isGameOver():
-                    current_time = microbit.running_time()  # Get the time at gameover.
-                    seconds_elapsed = (current_time - level_start_time) / 1000  # Convert milliseconds to seconds.
+            while not is_game_over():
+                get_input()
+                if events.length:  # The game only needs updating when something has happened.
+                    handle_events()
 
-                    # Display the time it took to complete the level, cut off any decimal places from the print-out.
-                    microbit.display.scroll("TIME:" + str(int(seconds_elapsed)) + " SECONDS.")
+                if self.idle:
+                    yield self.idle_logic_period
+                else:
+                    yield self.logic_period
+
+            self.level_running = False
+            # Measured first, before working anything else out allocates.
+            self.last_level_allocated = self.getMemoryUsed() - level_start_memory
+            self.last_level_steps = self.scheduler.steps - level_start_steps
+            self.last_level_time = ticksDiff(self.ticks(), level_start_time)  # The time at gameover, less the start.
+            # A collection part way through the level frees memory and makes the difference negative, but it only
+            # runs once something has been allocated, so any difference at all means the level allocated.
+            if self.last_level_allocated != 0:
+                self.allocating_levels += 1
+            self.levels_completed += 1
+            seconds_elapsed = self.last_level_time // 1000  # Convert milliseconds to whole seconds.
+
+            # Display the time it took to complete the level.
+            self.scrollText("TIME:" + str(seconds_elapsed) + " SECONDS.")
+
+            pickup_amount += self.pickup_amount_increase  # Make the next level a bit harder.
+
+    # Run every task until the game logic finishes. Nothing blocks, so each task keeps to its own rate.
+    def playGame(self):
+        scheduler = self.scheduler
+        self.idle = False
+        self.mode_start_time = self.ticks()
+        self.loadCalibration()
 
-                    pickup_amount += 1
+        scheduler.spawn(self.senseTask())
+        self.render_task = scheduler.spawn(self.renderTask())
+        scheduler.spawn(self.textTask())
+        scheduler.spawn(self.calibrationTask())
+        self.logic_task = scheduler.spawn(self.logicTask())
 
-                sleep(100)
+        scheduler.run(self.logic_task)
 
 
 def main():
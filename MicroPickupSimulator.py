@@ -0,0 +1,675 @@
+# Author: Nathan Dunne
+# Date 30/04/2019
+# Purpose: A pure-Python stand-in for the micro:bit hardware so MicroPickup can run headless on CPython/Linux.
+# This application is licensed under the Creative Commons Zero v1.0 Universal, public domain.
+# This file is never flashed to the micro:bit, so it is commented normally.
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+import MicroPickup
+
+DISPLAY_WIDTH = 5
+DISPLAY_HEIGHT = 5
+RESTING_ACCELERATION = 1000  # Acceleration due to gravity, in milli-g.
+SCROLL_COLUMNS_PER_CHARACTER = 6  # Each character is 5 columns wide plus a blank column.
+HORIZONTAL_FIELD = 20000  # The Earth's magnetic field along the ground, in nano-tesla.
+VERTICAL_FIELD = -45000  # And straight down into it.
+HARD_IRON_OFFSETS = (12000, -7000, 3000)  # Fields from magnets and iron on the board itself, for --uncalibrated.
+WALK_PERIOD = 10  # How often, in milliseconds, the simulated player is updated when playing in real time.
+
+
+# Time as the host sees it. Sleeping really waits.
+class WallClock:
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+
+    def running_time(self):
+        return int((time.monotonic() - self.start_time) * 1000)
+
+    def sleep(self, milliseconds):
+        time.sleep(milliseconds / 1000)
+
+
+# Simulated time. Sleeping advances the clock instantly, then tells every listener the new time.
+class VirtualClock:
+
+    def __init__(self):
+        self.now = 0
+        self.listeners = []
+
+    def running_time(self):
+        return self.now
+
+    def sleep(self, milliseconds):
+        self.now += int(milliseconds)
+
+        for listener in self.listeners:
+            listener(self.now)
+
+
+# A picture for the display, as brightness values row by row. Like the device, the buffer is copied.
+class Image:
+
+    def __init__(self, width, height, buffer=None):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(buffer) if buffer is not None else bytearray(width * height)
+
+    def get_pixel(self, x, y):
+        return self.pixels[y * self.width + x]
+
+    def set_pixel(self, x, y, value):
+        self.pixels[y * self.width + x] = value
+
+
+# The 5x5 LED display. Brightness values are kept in a flat buffer, row by row.
+class Display:
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.pixels = bytearray(DISPLAY_WIDTH * DISPLAY_HEIGHT)
+        self.scrolled = []  # Every piece of text that has been scrolled, for inspection. None to not keep it.
+        self.pixel_writes = 0  # How many times set_pixel has been called.
+        self.shows = 0  # How many times show has been called.
+        self.echo = False  # Whether to print every frame shown, and every piece of text scrolled.
+
+    def set_pixel(self, x, y, value):
+        if not 0 <= x < DISPLAY_WIDTH or not 0 <= y < DISPLAY_HEIGHT:
+            raise ValueError("index out of bounds")
+        if not 0 <= value <= 9:
+            raise ValueError("brightness out of bounds")
+
+        self.pixels[y * DISPLAY_WIDTH + x] = value
+        self.pixel_writes += 1
+
+    def get_pixel(self, x, y):
+        return self.pixels[y * DISPLAY_WIDTH + x]
+
+    def show(self, image):
+        if image.width != DISPLAY_WIDTH or image.height != DISPLAY_HEIGHT:
+            raise ValueError("image must be %dx%d" % (DISPLAY_WIDTH, DISPLAY_HEIGHT))
+
+        self.pixels[:] = image.pixels
+        self.shows += 1
+        if self.echo:
+            print(self)
+            print()
+
+    def clear(self):
+        for index in range(len(self.pixels)):
+            self.pixels[index] = 0
+
+    # Unless wait is False, scrolling blocks for as long as the text takes to pass across the display.
+    def scroll(self, text, delay=150, wait=True, loop=False, monospace=False):
+        text = str(text)
+        if self.scrolled is not None:
+            self.scrolled.append(text)
+        if self.echo:
+            print(text)
+            print()
+
+        if wait:
+            self.clock.sleep((len(text) * SCROLL_COLUMNS_PER_CHARACTER + DISPLAY_WIDTH) * delay)
+
+    # Render the display as text, one row per line, for debugging.
+    def __str__(self):
+        rows = []
+        for y in range(DISPLAY_HEIGHT):
+            row = self.pixels[y * DISPLAY_WIDTH:(y + 1) * DISPLAY_WIDTH]
+            rows.append("".join(str(value) for value in row))
+
+        return "\n".join(rows)
+
+
+# Tilt a vector on the board by pitching the board forward the given degrees, turning about its x axis.
+def pitchVector(x, y, z, pitch):
+    angle = math.radians(pitch)
+    return x, y * math.cos(angle) + z * math.sin(angle), z * math.cos(angle) - y * math.sin(angle)
+
+
+# The magnetometer. The heading and pitch are set directly by whatever is driving the simulation, and the raw field
+# readings follow from them, in nano-tesla, plus any hard-iron offsets. With the board flat and facing north the field
+# points along +y; turning clockwise by the heading swings it towards -x.
+# The readings are only worked out again once the heading or pitch changes. Set the offsets before reading.
+class Compass:
+
+    def __init__(self, heading=0, offsets=(0, 0, 0)):
+        self.current_heading = heading
+        self.pitch = 0
+        self.offsets = offsets
+        self.calibrated = True
+        self.calibration_count = 0
+        self.field = None  # The last readings, for field_heading and field_pitch.
+        self.field_heading = None
+        self.field_pitch = None
+
+    # Like the device, asking an uncalibrated compass for a heading makes it calibrate first, which blocks.
+    def heading(self):
+        if not self.calibrated:
+            self.calibrate()
+
+        return self.current_heading
+
+    def getField(self, axis):
+        if self.current_heading != self.field_heading or self.pitch != self.field_pitch:
+            self.field_heading = self.current_heading
+            self.field_pitch = self.pitch
+            heading = math.radians(self.current_heading)
+            field = pitchVector(-HORIZONTAL_FIELD * math.sin(heading), HORIZONTAL_FIELD * math.cos(heading),
+                                VERTICAL_FIELD, self.pitch)
+            self.field = [int(offset + value) for offset, value in zip(self.offsets, field)]
+
+        return self.field[axis]
+
+    def get_x(self):
+        return self.getField(0)
+
+    def get_y(self):
+        return self.getField(1)
+
+    def get_z(self):
+        return self.getField(2)
+
+    def is_calibrated(self):
+        return self.calibrated
+
+    def calibrate(self):
+        self.calibration_count += 1
+        self.calibrated = True
+
+    def clear_calibration(self):
+        self.calibrated = False
+
+
+# The accelerometer, in milli-g. At rest only gravity is acting on the board.
+class Accelerometer:
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.z = -RESTING_ACCELERATION
+
+    def set_values(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def get_x(self):
+        return self.x
+
+    def get_y(self):
+        return self.y
+
+    def get_z(self):
+        return self.z
+
+    def get_values(self):
+        return self.x, self.y, self.z
+
+
+# A push button. Presses are latched until was_pressed() is read, as on the device.
+class Button:
+
+    def __init__(self):
+        self.pressed = False
+        self.presses = 0
+
+    def press(self):
+        self.pressed = True
+        self.presses += 1
+
+    def is_pressed(self):
+        return self.pressed
+
+    def was_pressed(self):
+        was_pressed = self.presses > 0
+        self.presses = 0
+        self.pressed = False
+
+        return was_pressed
+
+    def get_presses(self):
+        presses = self.presses
+        self.presses = 0
+
+        return presses
+
+
+# Everything MicroPickup.Game needs from the microbit module. Uses the host's wall clock unless given another.
+class Backend:
+
+    def __init__(self, clock=None):
+        if clock is None:
+            clock = WallClock()
+
+        self.clock = clock
+        self.display = Display(clock)
+        self.compass = Compass()
+        self.accelerometer = Accelerometer()
+        self.button_a = Button()
+        self.button_b = Button()
+        self.Image = Image
+        self.running_time = clock.running_time
+        self.sleep = clock.sleep
+
+
+# Runs the game's tasks under CPython's asyncio instead of MicroPickup.Scheduler. Each task is a generator that yields
+# how many milliseconds to sleep for. asyncio sleeps in real time, so use this with the wall clock.
+class AsyncioScheduler:
+
+    def __init__(self):
+        self.tasks = []
+        self.wakeups = []
+        self.overruns = 0
+        self.steps = 0
+
+    def spawn(self, task):
+        self.tasks.append(task)
+        self.wakeups.append(asyncio.Event())
+
+        return len(self.tasks) - 1
+
+    def wake(self, index):
+        self.wakeups[index].set()
+
+    def run(self, main_index):
+        asyncio.run(self.runTasks(main_index))
+
+        self.tasks = []
+        self.wakeups = []
+
+    async def runTasks(self, main_index):
+        runners = [asyncio.ensure_future(self.drive(index)) for index in range(len(self.tasks))]
+
+        try:
+            await runners[main_index]
+        finally:
+            for runner in runners:
+                runner.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
+
+    # Run a task, sleeping in between on the same deadlines as MicroPickup.Scheduler, unless it is woken early.
+    async def drive(self, index):
+        task = self.tasks[index]
+        wakeup = self.wakeups[index]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+
+        for delay in task:
+            self.steps += 1
+            deadline += delay / 1000
+            if deadline <= loop.time():
+                self.overruns += 1
+                deadline = loop.time() + delay / 1000
+
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), deadline - loop.time())
+                deadline = loop.time()
+            except asyncio.TimeoutError:
+                pass
+
+
+# Raised when a level has gone on for longer than the simulation allows, e.g. the player can never move.
+class SimulationTimeout(Exception):
+    pass
+
+
+# A simulated player. Faces towards the nearest pickup and takes a step every stride_period milliseconds,
+# with the acceleration peaking at step_acceleration for step_duration milliseconds of each stride.
+# If pause_time is given, they stand still for pause_time milliseconds after every walk_time milliseconds of walking.
+# If turn_rate is given, they turn towards the pickup at that many degrees a second, rather than instantly, and
+# stand still until they are facing within turn_tolerance degrees of it.
+# If sway is given, the board rocks forward and back by up to that many degrees with every stride.
+# If spin is given, they first turn on the spot by that many degrees at turn_rate, such as to calibrate the compass.
+class Walker:
+
+    def __init__(self, backend, game, stride_period=500, step_duration=100, step_acceleration=1500,
+                 heading_jitter=0, walk_time=0, pause_time=0, turn_rate=0, turn_tolerance=20, sway=0, spin=0,
+                 seed=None):
+        self.backend = backend
+        self.game = game
+        self.stride_period = stride_period
+        self.step_duration = step_duration
+        self.step_acceleration = step_acceleration
+        self.heading_jitter = heading_jitter
+        self.walk_time = walk_time
+        self.pause_time = pause_time
+        self.turn_rate = turn_rate
+        self.turn_tolerance = turn_tolerance
+        self.sway = sway
+        self.spin = spin  # Degrees of the first spin still to turn.
+        self.facing = 0.0  # The way they are actually facing, while turning.
+        self.last_update = 0
+        self.random = random.Random(seed)
+        self.cell = -1  # The player's cell and the pickups the heading was last worked out for.
+        self.mask = -1
+        self.heading = 0
+
+    def update(self, now):
+        game = self.game
+        cell = game.player.cell
+        mask = game.pickups.mask
+        if cell != self.cell or mask != self.mask:  # Only look for the nearest pickup again once something has moved.
+            self.cell = cell
+            self.mask = mask
+            self.heading = self.findHeading()
+
+        heading = self.heading
+        turning = False
+
+        if self.spin > 0:
+            turn = min(self.spin, self.turn_rate * (now - self.last_update) / 1000)
+            self.spin -= turn
+            self.facing = (self.facing + turn) % 360
+            heading = self.facing
+            turning = True
+        elif self.turn_rate:
+            turn = (heading - self.facing + 180) % 360 - 180  # The shortest way round.
+            most = self.turn_rate * (now - self.last_update) / 1000
+            self.facing = (self.facing + max(-most, min(most, turn))) % 360
+            heading = self.facing
+            turning = abs(turn) > self.turn_tolerance
+        self.last_update = now
+
+        if self.heading_jitter:
+            heading += self.random.uniform(-self.heading_jitter, self.heading_jitter)
+
+        pitch = 0  # Only swaying while walking.
+
+        if turning or self.pause_time and now % (self.walk_time + self.pause_time) >= self.walk_time:
+            acceleration = RESTING_ACCELERATION
+        else:
+            if self.sway:
+                pitch = self.sway * math.sin(2 * math.pi * now / self.stride_period)
+            if now % self.stride_period < self.step_duration:
+                acceleration = self.step_acceleration
+            else:
+                acceleration = RESTING_ACCELERATION
+
+        self.backend.compass.current_heading = int(heading) % 360
+        self.backend.compass.pitch = pitch
+
+        if pitch:
+            x, y, z = pitchVector(0, 0, -acceleration, pitch)
+            self.backend.accelerometer.set_values(int(x), int(y), int(z))
+        else:
+            self.backend.accelerometer.set_values(0, 0, -acceleration)
+
+    # Head east or west until in the right column, then north or south. North is up the display.
+    # When the game allows diagonal moves, head diagonally until in the right row or column instead.
+    def findHeading(self):
+        player_x, player_y = playerCell(self.game)
+        eight_way = self.game.eight_way
+        target = None
+        target_distance = 0
+
+        for x, y in pickupCells(self.game):
+            if eight_way:
+                distance = max(abs(x - player_x), abs(y - player_y))
+            else:
+                distance = abs(x - player_x) + abs(y - player_y)
+            if target is None or distance < target_distance:
+                target = (x, y)
+                target_distance = distance
+
+        if target is None:
+            return self.backend.compass.current_heading
+
+        target_x, target_y = target
+
+        if eight_way and target_x != player_x and target_y != player_y:
+            if target_x > player_x:
+                return 135 if target_y > player_y else 45
+            return 225 if target_y > player_y else 315
+
+        if target_x > player_x:
+            return 90
+        if target_x < player_x:
+            return 270
+        if target_y > player_y:
+            return 180
+
+        return 0
+
+
+def playerCell(game):
+    cell = game.player.cell
+    return cell % MicroPickup.GRID_WIDTH, cell // MicroPickup.GRID_WIDTH
+
+
+def pickupCells(game):
+    width = MicroPickup.GRID_WIDTH
+    pickups = game.pickups
+    return [(cell % width, cell // width) for cell in sorted(pickups.cells[:pickups.count])]
+
+
+# Play the given amount of levels in virtual time. Returns the time taken by each, in milliseconds, and the Game.
+# settings are applied to the Game (e.g. acceleration_needed_to_move), walker_settings to the Walker.
+# If uncalibrated, the compass starts with no calibration and hard-iron offsets on its raw readings.
+# The game's calibration is only saved to and loaded from a file if settings gives a calibration_file.
+# If on_level is given, it is called with the Game at the end of each level.
+# Unless keep_scrolled, the scrolled text is not kept, so that the simulator holds on to nothing the game allocated.
+def simulate(levels, seed=None, max_level_time=600000, settings=None, walker_settings=None, uncalibrated=False,
+             on_level=None, keep_scrolled=True):
+    random.seed(seed)
+
+    clock = VirtualClock()
+    backend = Backend(clock)
+    if uncalibrated:
+        backend.compass.calibrated = False
+        backend.compass.offsets = HARD_IRON_OFFSETS
+    if not keep_scrolled:
+        backend.display.scrolled = None
+    game = MicroPickup.Game(backend)
+    game.calibration_file = None
+
+    for name, value in (settings or {}).items():
+        setattr(game, name, value)
+
+    walker = Walker(backend, game, seed=seed, **(walker_settings or {}))
+    level_times = array("l")  # Copies the values, rather than keeping the game's ints.
+    level_start = [0]
+
+    def onTick(now):
+        if game.levels_completed > len(level_times):
+            level_times.append(game.last_level_time)
+            if on_level is not None:
+                on_level(game)
+            level_start[0] = now
+            if len(level_times) >= levels:
+                game.game_running = False
+        elif game.game_running and now - level_start[0] > max_level_time:
+            raise SimulationTimeout("level %d not completed in %d ms" % (len(level_times) + 1, max_level_time))
+
+        walker.update(now)
+
+    clock.listeners.append(onTick)
+    game.playGame()
+
+    return list(level_times), game
+
+
+def parseList(text, kind=int):
+    return [kind(value) for value in text.split(",")]
+
+
+# The Walker's settings from the command line arguments.
+def getWalkerSettings(arguments):
+    walker_settings = {"step_acceleration": arguments.step_acceleration}
+    if arguments.pause:
+        walker_settings["walk_time"], walker_settings["pause_time"] = arguments.pause
+    if arguments.turn_rate:
+        walker_settings["turn_rate"] = arguments.turn_rate
+    if arguments.jitter:
+        walker_settings["heading_jitter"] = arguments.jitter
+    if arguments.sway:
+        walker_settings["sway"] = arguments.sway
+    if arguments.uncalibrated:  # Turn round once to calibrate, as the player is told to.
+        walker_settings["turn_rate"] = arguments.turn_rate or 90
+        walker_settings["spin"] = 360
+
+    return walker_settings
+
+
+# A task for the game's scheduler that keeps the Walker moving, for playing on the wall clock.
+def walkTask(walker, clock):
+    while True:
+        walker.update(clock.running_time())
+        yield WALK_PERIOD
+
+
+# Play in real time, with the Walker as the player, printing the display every time a frame is shown and any text
+# as it scrolls. Runs until interrupted.
+def play(arguments):
+    backend = Backend()
+    backend.display.echo = True
+    if arguments.uncalibrated:
+        backend.compass.calibrated = False
+        backend.compass.offsets = HARD_IRON_OFFSETS
+    game = MicroPickup.Game(backend)
+    game.eight_way = arguments.eight_way
+    game.calibration_file = arguments.calibration_file
+    if arguments.asyncio:
+        game.scheduler = AsyncioScheduler()
+
+    walker = Walker(backend, game, seed=arguments.seed, **getWalkerSettings(arguments))
+    game.scheduler.spawn(walkTask(walker, backend.clock))
+    try:
+        game.playGame()
+    except KeyboardInterrupt:
+        pass
+
+
+# Soak test the game loop, optionally sweeping the movement threshold and pickup progression.
+def runSimulations(arguments):
+    thresholds = arguments.thresholds or [MicroPickup.Game.acceleration_needed_to_move]
+    starting_amounts = arguments.starting_pickups or [MicroPickup.Game.starting_pickup_amount]
+    increases = arguments.pickup_increases or [MicroPickup.Game.pickup_amount_increase]
+
+    print("threshold  start  increase  levels  mean level ms  idle %  overruns  levels/s (host)")
+
+    for threshold in thresholds:
+        for starting_amount in starting_amounts:
+            for increase in increases:
+                settings = {
+                    "acceleration_needed_to_move": threshold,
+                    "starting_pickup_amount": starting_amount,
+                    "pickup_amount_increase": increase,
+                    "calibration_file": arguments.calibration_file,
+                    "eight_way": arguments.eight_way,
+                }
+                walker_settings = getWalkerSettings(arguments)
+
+                wall_start = time.perf_counter()
+                try:
+                    level_times, game = simulate(arguments.levels, arguments.seed, arguments.max_level_time,
+                                                 settings, walker_settings, arguments.uncalibrated)
+                except SimulationTimeout as error:
+                    print("%9d  %5d  %8d  timeout: %s" % (threshold, starting_amount, increase, error))
+                    continue
+                wall_time = time.perf_counter() - wall_start
+
+                idle_percent = 100 * game.idle_time / max(1, game.idle_time + game.active_time)
+
+                print("%9d  %5d  %8d  %6d  %13.0f  %6.1f  %8d  %15.0f" % (
+                    threshold, starting_amount, increase, len(level_times), sum(level_times) / len(level_times),
+                    idle_percent, game.scheduler.overruns, len(level_times) / wall_time))
+
+                if arguments.uncalibrated:
+                    print("%9s  blocking calibrations: %d, calibrated in game: %s, loaded from file: %s" % (
+                        "", game.compass.calibration_count, game.calibrator.calibrated, game.calibration_loaded))
+
+
+# The bytes allocated by MicroPickup.py that are still in use, while tracemalloc is tracing. Blocks with a size in
+# ignored_sizes are left out.
+def getTracedGameMemory(ignored_sizes=()):
+    snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(True, MicroPickup.__file__),))
+    return sum(trace.size for trace in snapshot.traces if trace.size not in ignored_sizes)
+
+
+# Play levels with tracemalloc measuring the memory the game keeps from the start of one level to the start of the
+# next, and fail if any level keeps anything once the frame cache is full. Only memory the game keeps shows up here;
+# garbage it makes and drops needs MicroPickupBenchmark.py, run on MicroPython.
+# CPython boxes every int above 256, where MicroPython keeps ints up to 2**30 as small ints that are never allocated,
+# so how many are alive changes with the values the game holds, such as the frame cache's keys. Blocks the size of
+# such an int are left out; arithmetic can allocate one with a digit to spare. A leak of ints, or of anything else
+# that size, still grows whatever holds on to them.
+def checkAllocations(arguments):
+    level_starts = array("l")  # The game asks for the memory used at the start and at the end of each level.
+    level_steps = array("l")
+    warmed_up = array("b")  # Whether the frame cache was already full when each level started.
+    cache_full = [False]
+
+    def getMemoryUsed():
+        memory = getTracedGameMemory(int_sizes)
+        level_starts.append(memory)
+        return memory
+
+    def onLevel(game):
+        level_steps.append(game.last_level_steps)
+        warmed_up.append(cache_full[0])
+        cache_full[0] = len(game.image_keys) >= game.image_cache_size
+
+    int_sizes = range(sys.getsizeof(1), sys.getsizeof(1 << 30) + 1)
+    tracemalloc.start()
+    try:
+        # One more level than is checked, so the last level checked has a start after it.
+        simulate(arguments.levels + 1, arguments.seed, arguments.max_level_time, {"memory_used": getMemoryUsed},
+                 on_level=onLevel, keep_scrolled=False)
+    finally:
+        tracemalloc.stop()
+
+    level_starts = level_starts[::2]
+    allocating_levels = 0
+
+    print("level  bytes kept  steps  warmed up")
+    for level in range(1, arguments.levels + 1):
+        kept = level_starts[level] - level_starts[level - 1]
+        print("%5d  %10d  %5d  %s" % (level, kept, level_steps[level - 1], "yes" if warmed_up[level - 1] else "no"))
+        if warmed_up[level - 1] and kept > 0:
+            allocating_levels += 1
+
+    print("warmed up levels that kept memory: %d" % allocating_levels)
+    if allocating_levels:
+        sys.exit("the game loop is allocating")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run MicroPickup without a micro:bit.")
+    parser.add_argument("--levels", type=int, help="simulate this many levels in virtual time instead of watching")
+    parser.add_argument("--asyncio", action="store_true", help="play with the game's tasks run by asyncio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-level-time", type=int, default=600000, help="virtual milliseconds before giving up")
+    parser.add_argument("--step-acceleration", type=int, default=1500, help="peak acceleration of a step, milli-g")
+    parser.add_argument("--pause", type=parseList, help="walk,pause: milliseconds of walking then standing still")
+    parser.add_argument("--turn-rate", type=int, default=0, help="degrees a second the player turns, 0 is instant")
+    parser.add_argument("--jitter", type=int, default=0, help="degrees the compass heading wobbles either way")
+    parser.add_argument("--sway", type=int, default=0, help="degrees the board rocks forward and back each stride")
+    parser.add_argument("--uncalibrated", action="store_true", help="start with an uncalibrated, offset compass")
+    parser.add_argument("--calibration-file", help="save the game's compass calibration here, and load it next time")
+    parser.add_argument("--eight-way", action="store_true", help="let the player move diagonally too")
+    parser.add_argument("--allocations", action="store_true", help="trace what each level allocates, with --levels")
+    parser.add_argument("--thresholds", type=parseList, help="comma separated acceleration_needed_to_move values")
+    parser.add_argument("--starting-pickups", type=parseList, help="comma separated starting_pickup_amount values")
+    parser.add_argument("--pickup-increases", type=parseList, help="comma separated pickup_amount_increase values")
+    arguments = parser.parse_args()
+
+    if arguments.levels and arguments.allocations:
+        checkAllocations(arguments)
+    elif arguments.levels:
+        runSimulations(arguments)
+    else:
+        play(arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Author: Nathan Dunne
+# Date 30/04/2019
+# Purpose: Start MicroPickup when the micro:bit powers up. The game itself is copied over as MicroPickup.mpy.
+# This application is licensed under the Creative Commons Zero v1.0 Universal, public domain.
+
+import MicroPickup
+
+MicroPickup.main()